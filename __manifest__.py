@@ -25,9 +25,14 @@
     'data': [
         'security/ir.model.access.csv',
         'data/sequence_data.xml',
+        'data/ir_cron_data.xml',
         'views/project_views.xml',
         'views/dynamic_requirement_field_views.xml',
         'views/dynamic_requirement_field_line_views.xml',
+        'views/project_stage_transition_views.xml',
+        'views/project_stage_migration_views.xml',
+        'wizard/dynamic_requirement_template_wizard_views.xml',
+        'wizard/project_stage_migration_wizard_views.xml',
     ],
     'installable': True,
     'auto_install': False,
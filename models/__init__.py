@@ -1,3 +1,8 @@
+from . import performance_stats
 from . import project_project
+from . import project_project_stage
+from . import project_stage_transition
+from . import project_stage_migration
+from . import project_task
 from . import dynamic_requirement_field
 from . import dynamic_requirement_field_line
\ No newline at end of file
@@ -1,4 +1,11 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+# Model holding the mandatory fields of each requirement type
+MANDATORY_FIELDS_MODELS = {
+    'site': 'project.project',
+    'milestone': 'project.task',
+}
 
 
 class DynamicRequirementField(models.Model):
@@ -24,12 +31,27 @@ class DynamicRequirementField(models.Model):
         default=lambda self: self.env.company
     )
 
-    @api.model
-    def create(self, vals):
-        if vals.get('name', 'Requirement') == 'Requirement':
-            sequence = self.env['ir.sequence'].next_by_code('dynamic.requirement.field') or '1'
-            vals['name'] = f"Requirement {sequence}"
-        return super(DynamicRequirementField, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        vals_to_name = [vals for vals in vals_list if vals.get('name', 'Requirement') == 'Requirement']
+        if vals_to_name:
+            sequences = self._reserve_sequence_numbers(len(vals_to_name))
+            for vals, sequence in zip(vals_to_name, sequences):
+                vals['name'] = f"Requirement {sequence}"
+        records = super(DynamicRequirementField, self).create(vals_list)
+        # Compiled stage rules depend on the requirement state, drop them on any change
+        self.clear_caches()
+        return records
+
+    def write(self, vals):
+        result = super(DynamicRequirementField, self).write(vals)
+        self.clear_caches()
+        return result
+
+    def unlink(self):
+        result = super(DynamicRequirementField, self).unlink()
+        self.clear_caches()
+        return result
 
     def copy(self, default=None):
         if default is None:
@@ -37,6 +59,186 @@ class DynamicRequirementField(models.Model):
         default['name'] = self.name + ' (Copy)'
         return super(DynamicRequirementField, self).copy(default)
 
+    @api.model
+    def _reserve_sequence_numbers(self, count):
+        """
+        Reserve count numbers of the requirement sequence in one call
+        Returns the list of formatted numbers, like next_by_code would return them
+        """
+        sequence = self.env['ir.sequence'].sudo().search([
+            ('code', '=', 'dynamic.requirement.field'),
+            ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+        if not sequence:
+            return ['1'] * count
+
+        # Date ranged sequences format each number with its own range
+        if sequence.use_date_range:
+            return [sequence._next() for __ in range(count)]
+
+        if sequence.implementation == 'standard':
+            self.env.cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                ('ir_sequence_%03d' % sequence.id, count)
+            )
+            numbers = [row[0] for row in self.env.cr.fetchall()]
+        else:
+            self.env.cr.execute(
+                "SELECT number_next FROM ir_sequence WHERE id = %s FOR UPDATE NOWAIT",
+                (sequence.id,)
+            )
+            number_next = self.env.cr.fetchone()[0]
+            self.env.cr.execute(
+                "UPDATE ir_sequence SET number_next = number_next + %s WHERE id = %s",
+                (sequence.number_increment * count, sequence.id)
+            )
+            sequence.invalidate_recordset(['number_next'])
+            numbers = [number_next + index * sequence.number_increment for index in range(count)]
+
+        prefix, suffix = sequence._get_prefix_suffix()
+        return [prefix + '%%0%sd' % sequence.padding % number + suffix for number in numbers]
+
+    def export_requirement_templates(self):
+        """
+        Export complete requirement definitions with their stage lines
+        Stages are referenced by name and mandatory fields by technical name,
+        so the result can be imported into another company or database
+        Returns a JSON serializable list of dicts
+        """
+        return [
+            {
+                'name': requirement.name,
+                'type': requirement.type,
+                'sequence': requirement.sequence,
+                'active': requirement.active,
+                'lines': [
+                    {
+                        'sequence': line.sequence,
+                        'stage': line.stage_id.name or False,
+                        'task_stage': line.task_stage_id.name or False,
+                        'mandatory_fields': line.mandatory_fields.mapped('name'),
+                        'custom_warning_message': line.custom_warning_message,
+                    }
+                    for line in requirement.mandatory_project_line
+                ],
+            }
+            for requirement in self
+        ]
+
+    @api.model
+    def _check_template_structure(self, templates):
+        """
+        Check the structure of requirement templates, e.g. of a hand-edited file
+        Returns a tuple (well formed templates, list of error messages), the
+        templates having a malformed value are left out
+        """
+        if not isinstance(templates, list):
+            return [], [_("The templates must be a list of requirements")]
+
+        valid_templates = []
+        errors = []
+        for index, template in enumerate(templates, 1):
+            if not isinstance(template, dict):
+                errors.append(_("Requirement %s is not an object", index))
+                continue
+            name = template.get('name') or index
+            template_errors = []
+            requirement_type = template.get('type')
+            if not isinstance(requirement_type, str) or requirement_type not in MANDATORY_FIELDS_MODELS:
+                template_errors.append(_("Requirement %s: unknown type %r", name, requirement_type))
+            lines = template.get('lines', [])
+            if not isinstance(lines, list):
+                template_errors.append(_("Requirement %s: lines must be a list", name))
+                lines = []
+            for line_index, line in enumerate(lines, 1):
+                if not isinstance(line, dict):
+                    template_errors.append(_("Requirement %s, line %s is not an object", name, line_index))
+                    continue
+                message = line.get('custom_warning_message')
+                if not isinstance(message, str) or not message:
+                    template_errors.append(_("Requirement %s, line %s: missing custom warning message", name, line_index))
+                for key in ('stage', 'task_stage'):
+                    if line.get(key) and not isinstance(line[key], str):
+                        template_errors.append(_("Requirement %s, line %s: %s must be a name", name, line_index, key))
+                field_names = line.get('mandatory_fields', [])
+                if not isinstance(field_names, list) or not all(isinstance(field_name, str) for field_name in field_names):
+                    template_errors.append(_("Requirement %s, line %s: mandatory fields must be a list of field names", name, line_index))
+            if template_errors:
+                errors += template_errors
+            else:
+                valid_templates.append(template)
+        return valid_templates, errors
+
+    @api.model
+    def import_requirement_templates(self, templates, company_id=False):
+        """
+        Import requirement definitions exported by export_requirement_templates
+        Stages and mandatory fields of all the templates are resolved with one
+        search per model and the requirements are created in a single create
+        Malformed templates, unknown stages and unknown fields are all reported
+        in a single error
+        Returns the created requirements
+        """
+        company_id = company_id or self.env.company.id
+        templates, errors = self._check_template_structure(templates)
+        line_templates = [line for template in templates for line in template.get('lines', [])]
+
+        stage_names = {line['stage'] for line in line_templates if line.get('stage')}
+        task_stage_names = {line['task_stage'] for line in line_templates if line.get('task_stage')}
+        stages = {}
+        for stage in self.env['project.project.stage'].search([('name', 'in', list(stage_names))], order='id desc'):
+            stages[stage.name] = stage.id
+        task_stages = {}
+        for stage in self.env['project.task.type'].search([('name', 'in', list(task_stage_names))], order='id desc'):
+            task_stages[stage.name] = stage.id
+
+        field_names = {name for line in line_templates for name in line.get('mandatory_fields', [])}
+        model_fields = {}
+        for field in self.env['ir.model.fields'].search([
+            ('model', 'in', list(MANDATORY_FIELDS_MODELS.values())),
+            ('name', 'in', list(field_names)),
+        ]):
+            model_fields[(field.model, field.name)] = field.id
+
+        vals_list = []
+        for template in templates:
+            model_name = MANDATORY_FIELDS_MODELS[template['type']]
+            lines_vals = []
+            for line in template.get('lines', []):
+                line_vals = {
+                    'sequence': line.get('sequence', 10),
+                    'custom_warning_message': line['custom_warning_message'],
+                    'company_id': company_id,
+                }
+                if line.get('stage'):
+                    if line['stage'] not in stages:
+                        errors.append(_("Stage '%s' not found", line['stage']))
+                    line_vals['stage_id'] = stages.get(line['stage'], False)
+                if line.get('task_stage'):
+                    if line['task_stage'] not in task_stages:
+                        errors.append(_("Milestone stage '%s' not found", line['task_stage']))
+                    line_vals['task_stage_id'] = task_stages.get(line['task_stage'], False)
+                field_ids = []
+                for name in line.get('mandatory_fields', []):
+                    if (model_name, name) not in model_fields:
+                        errors.append(_("Field '%s' not found on %s", name, model_name))
+                    else:
+                        field_ids.append(model_fields[(model_name, name)])
+                line_vals['mandatory_fields'] = [(6, 0, field_ids)]
+                lines_vals.append((0, 0, line_vals))
+            vals_list.append({
+                'name': template.get('name') or 'Requirement',
+                'type': template['type'],
+                'sequence': template.get('sequence', 10),
+                'active': template.get('active', True),
+                'company_id': company_id,
+                'mandatory_project_line': lines_vals,
+            })
+
+        if errors:
+            raise UserError('\n'.join(dict.fromkeys(errors)))
+        return self.create(vals_list)
+
     @api.model
     def get_requirements_for_stage(self, stage_id, requirement_type):
         """
@@ -1,4 +1,7 @@
-from odoo import models, fields, api
+from collections import Counter
+
+from odoo import models, fields, api, tools
+from odoo.tools import split_every
 
 
 class DynamicRequirementFieldLine(models.Model):
@@ -11,10 +14,18 @@ class DynamicRequirementFieldLine(models.Model):
         'dynamic.requirement.field', 
         string='Requirement Mandatory Project'
     )
+    requirement_type = fields.Selection(
+        related='requirement_mandatory_project.type',
+        string='Requirement Type'
+    )
     stage_id = fields.Many2one(
         'project.project.stage', 
         string='Stage'
     )
+    task_stage_id = fields.Many2one(
+        'project.task.type',
+        string='Milestone Stage'
+    )
     mandatory_fields = fields.Many2many(
         'ir.model.fields', 
         string='Mandatory Fields'
@@ -31,45 +42,130 @@ class DynamicRequirementFieldLine(models.Model):
         default=lambda self: self.env.company
     )
 
-    @api.constrains('stage_id', 'requirement_mandatory_project')
-    def _check_unique_stage_per_requirement(self):
-        """
-        Ensure that each stage can only be defined once per requirement
-        """
-        for record in self:
-            if record.stage_id and record.requirement_mandatory_project:
-                duplicate = self.search([
-                    ('id', '!=', record.id),
-                    ('stage_id', '=', record.stage_id.id),
-                    ('requirement_mandatory_project', '=', record.requirement_mandatory_project.id)
-                ])
-                if duplicate:
-                    raise models.ValidationError(
-                        f"Stage '{record.stage_id.name}' is already defined for requirement '{record.requirement_mandatory_project.name}'"
-                    )
-                    
+    _sql_constraints = [
+        ('stage_requirement_uniq', 'unique(requirement_mandatory_project, stage_id)',
+         'Each stage can only be defined once per requirement'),
+        ('task_stage_requirement_uniq', 'unique(requirement_mandatory_project, task_stage_id)',
+         'Each milestone stage can only be defined once per requirement'),
+    ]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self._check_unique_stage_per_requirement([
+            (vals.get('requirement_mandatory_project'), vals.get('stage_id'), vals.get('task_stage_id'))
+            for vals in vals_list
+        ])
+        records = super(DynamicRequirementFieldLine, self).create(vals_list)
+        # Compiled stage rules are cached per worker, drop them on any change
+        self.clear_caches()
+        records._recompute_site_readiness(records.requirement_mandatory_project)
+        return records
+
+    def write(self, vals):
+        if {'requirement_mandatory_project', 'stage_id', 'task_stage_id'}.intersection(vals):
+            self._check_unique_stage_per_requirement([
+                (
+                    vals.get('requirement_mandatory_project', record.requirement_mandatory_project.id),
+                    vals.get('stage_id', record.stage_id.id),
+                    vals.get('task_stage_id', record.task_stage_id.id),
+                )
+                for record in self
+            ])
+        requirements = self.requirement_mandatory_project
+        result = super(DynamicRequirementFieldLine, self).write(vals)
+        self.clear_caches()
+        self._recompute_site_readiness(requirements | self.requirement_mandatory_project)
+        return result
+
+    def unlink(self):
+        requirements = self.requirement_mandatory_project
+        result = super(DynamicRequirementFieldLine, self).unlink()
+        self.clear_caches()
+        self._recompute_site_readiness(requirements)
+        return result
+
+    def _recompute_site_readiness(self, requirements):
+        """
+        Recompute the stage readiness of the sites using the given requirements,
+        including the sites hidden from the current user by record rules
+        """
+        site_requirements = requirements.filtered(lambda requirement: requirement.type == 'site')
+        if site_requirements:
+            projects = self.env['project.project'].sudo().with_context(active_test=False).search([
+                ('requirement_id', 'in', site_requirements.ids),
+            ])
+            projects._recompute_stage_readiness()
+
+    def _check_unique_stage_per_requirement(self, stage_keys):
+        """
+        Ensure that each stage can only be defined once per requirement, before
+        creating or writing lines; the unique constraints back this check in the
+        database, but only report the first duplicate they hit
+        stage_keys is a list of (requirement_id, stage_id, task_stage_id) about
+        to be saved, self holds the lines being written, ignored as duplicates
+        All the duplicates are reported in one error, with a single query
+        """
+        keys = [
+            (requirement_id, stage_field, stage_id)
+            for requirement_id, stage_id, task_stage_id in stage_keys
+            for stage_field, stage_id in (('stage_id', stage_id), ('task_stage_id', task_stage_id))
+            if requirement_id and stage_id
+        ]
+        if not keys:
+            return
+
+        # Duplicates within the lines being saved
+        duplicates = {key for key, count in Counter(keys).items() if count > 1}
+
+        # Duplicates against the lines already in the database
+        existing_lines = self.search_read([
+            ('id', 'not in', self.ids),
+            ('requirement_mandatory_project', 'in', list({key[0] for key in keys})),
+            '|',
+            ('stage_id', 'in', [key[2] for key in keys if key[1] == 'stage_id']),
+            ('task_stage_id', 'in', [key[2] for key in keys if key[1] == 'task_stage_id']),
+        ], ['requirement_mandatory_project', 'stage_id', 'task_stage_id'], load=None)
+        existing_keys = set()
+        for line in existing_lines:
+            for stage_field in ('stage_id', 'task_stage_id'):
+                if line[stage_field]:
+                    existing_keys.add((line['requirement_mandatory_project'], stage_field, line[stage_field]))
+        duplicates |= existing_keys.intersection(keys)
+
+        if duplicates:
+            requirement_obj = self.env['dynamic.requirement.field']
+            messages = [
+                f"Stage '{self.env[self._fields[stage_field].comodel_name].browse(stage_id).name}' "
+                f"is already defined for requirement '{requirement_obj.browse(requirement_id).name}'"
+                for requirement_id, stage_field, stage_id in sorted(duplicates)
+            ]
+            raise models.ValidationError('\n'.join(messages))
+
     @api.constrains('custom_warning_message')
     def _check_warning_message_format(self):
         """
         Ensure that custom_warning_message contains the %s placeholder
         """
-        for record in self:
-            if record.custom_warning_message and '%s' not in record.custom_warning_message:
-                raise models.ValidationError(
-                    "Custom Warning Message must contain '%s' as a placeholder for the field name(s)"
-                )
+        invalid_messages = [
+            record.custom_warning_message for record in self
+            if record.custom_warning_message and '%s' not in record.custom_warning_message
+        ]
+        if invalid_messages:
+            raise models.ValidationError(
+                "Custom Warning Message must contain '%s' as a placeholder for the field name(s)\n"
+                + '\n'.join(f"'{message}'" for message in dict.fromkeys(invalid_messages))
+            )
 
     def check_mandatory_fields_completion(self, record):
         """
         Check if all mandatory fields are completed for a given record
         Returns a tuple (is_complete, missing_fields, warning_message)
         """
-        missing_fields = []
-        
-        for field in self.mandatory_fields:
-            field_value = getattr(record, field.name, None)
-            if not field_value or (isinstance(field_value, str) and not field_value.strip()):
-                missing_fields.append(field.field_description or field.name)
+        missing_names = self._get_records_missing_fields(record, self.mandatory_fields.mapped('name'))[record.id]
+        missing_fields = [
+            field.field_description or field.name
+            for field in self.mandatory_fields if field.name in missing_names
+        ]
         
         is_complete = len(missing_fields) == 0
         warning_message = self.custom_warning_message if not is_complete else ""
@@ -86,3 +182,224 @@ class DynamicRequirementFieldLine(models.Model):
             ('requirement_mandatory_project.type', '=', record._name),
             ('requirement_mandatory_project.active', '=', True)
         ])
+
+    @api.model
+    def _get_stage_field_name(self, requirement_type):
+        """
+        Get the line field holding the stage for a requirement type:
+        sites move through project stages and milestones through task stages
+        """
+        return 'task_stage_id' if requirement_type == 'milestone' else 'stage_id'
+
+    @api.model
+    @tools.ormcache('requirement_type', 'requirement_id', 'stage_id', 'self.env.lang')
+    def _get_compiled_stage_rules(self, requirement_type, requirement_id, stage_id):
+        """
+        Get the compiled rules of a requirement for a specific type and stage
+        Every line of the requirement applies, whatever its company, so a
+        requirement shared between companies validates all their records
+        Returns a tuple of (line_id, ((field_name, field_label), ...), warning_message)
+        made of plain values only, so the result can be cached per worker
+        """
+        lines = self.sudo().search([
+            ('requirement_mandatory_project', '=', requirement_id),
+            ('requirement_mandatory_project.active', '=', True),
+            ('requirement_mandatory_project.type', '=', requirement_type),
+            (self._get_stage_field_name(requirement_type), '=', stage_id),
+        ])
+        return tuple(
+            (
+                line.id,
+                tuple((field.name, field.field_description or field.name) for field in line.mandatory_fields),
+                line.custom_warning_message,
+            )
+            for line in lines
+        )
+
+    @api.model
+    def _get_empty_field_predicate(self, records, field):
+        """
+        Build the SQL predicate telling whether a field of the records table is empty,
+        with the same meaning as the truthiness of the field value on the record
+        Returns a tuple (sql, params) or None when the field must be read through the ORM
+        """
+        column = f'"{records._table}"."{field.name}"'
+        if not field.store or field.translate:
+            return None
+
+        if field.type == 'one2many':
+            comodel = records.env[field.comodel_name].with_context(**field.context)
+            domain = field.get_domain_list(records) + [(field.inverse_name, '!=', False)]
+            subquery, params = comodel._search(domain).subselect(f'"{comodel._table}"."{field.inverse_name}"')
+            return f'"{records._table}"."id" NOT IN ({subquery})', params
+
+        if field.type == 'many2many':
+            comodel = records.env[field.comodel_name].with_context(**field.context)
+            subquery, params = comodel._search(field.get_domain_list(records)).subselect()
+            return (
+                f'"{records._table}"."id" NOT IN ('
+                f'SELECT "{field.column1}" FROM "{field.relation}" WHERE "{field.column2}" IN ({subquery}))'
+            ), params
+
+        if not field.column_type:
+            return None
+        if field.type in ('char', 'text', 'html', 'selection'):
+            # Blank strings are empty too, like str.strip() in the ORM check
+            return f"({column} IS NULL OR {column} !~ '\\S')", []
+        if field.type in ('integer', 'float', 'monetary', 'many2one_reference'):
+            return f'({column} IS NULL OR {column} = 0)', []
+        if field.type == 'boolean':
+            return f'({column} IS NOT TRUE)', []
+        if field.type in ('many2one', 'date', 'datetime'):
+            return f'({column} IS NULL)', []
+        return None
+
+    @api.model
+    def _get_records_missing_fields(self, records, field_names):
+        """
+        Get the empty mandatory fields of each record
+        Returns a dict {record_id: set of missing field names}
+
+        Stored fields are evaluated by a single SQL query over the whole recordset
+        with one emptiness predicate per field, x2many fields included; only the
+        other fields (non-stored, translated, ...) are read through the ORM
+        """
+        missing = {record.id: set() for record in records}
+        sql_fields = []
+        orm_field_names = []
+        for field_name in field_names:
+            field = records._fields.get(field_name)
+            if field is None:
+                # Unknown fields can never be filled
+                for missing_names in missing.values():
+                    missing_names.add(field_name)
+                continue
+            predicate = self._get_empty_field_predicate(records, field)
+            if predicate and all(isinstance(record_id, int) for record_id in records.ids):
+                sql_fields.append((field_name, predicate))
+            else:
+                orm_field_names.append(field_name)
+
+        if sql_fields and records:
+            records.flush_recordset([field_name for field_name, __ in sql_fields])
+            for field_name, __ in sql_fields:
+                field = records._fields[field_name]
+                if field.type == 'one2many':
+                    records.env[field.comodel_name].flush_model([field.inverse_name])
+
+            select = ', '.join(f'{sql} AS "{field_name}"' for field_name, (sql, __) in sql_fields)
+            params = [param for __, (__, predicate_params) in sql_fields for param in predicate_params]
+            query = f'SELECT "{records._table}"."id", {select} FROM "{records._table}" WHERE "{records._table}"."id" IN %s'
+            for record_ids in split_every(self.env.cr.IN_MAX, records.ids):
+                self.env.cr.execute(query, params + [tuple(record_ids)])
+                for row in self.env.cr.dictfetchall():
+                    for field_name, __ in sql_fields:
+                        if row[field_name]:
+                            missing[row['id']].add(field_name)
+
+        for field_name in orm_field_names:
+            for record in records:
+                field_value = getattr(record, field_name, None)
+                if not field_value or (isinstance(field_value, str) and not field_value.strip()):
+                    missing[record.id].add(field_name)
+        return missing
+
+    @api.model
+    @tools.ormcache('requirement_type')
+    def _get_mandatory_field_names(self, requirement_type):
+        """
+        Get the names of all the fields used as mandatory by active requirements of a type
+        Used to know whether a write may change the stage readiness of a record
+        """
+        lines = self.sudo().search([
+            ('requirement_mandatory_project.active', '=', True),
+            ('requirement_mandatory_project.type', '=', requirement_type),
+        ])
+        return frozenset(lines.mandatory_fields.mapped('name'))
+
+    @api.model
+    def _is_readiness_field(self, field):
+        """
+        Tell whether a mandatory field is tracked by the stored stage readiness
+        Only stored fields written on the record itself are: x2many, related and
+        computed fields change without a write on the record and would leave
+        the stored readiness stale, they are still enforced on stage change
+        """
+        return bool(field) and field.store and not field.compute and field.type not in ('one2many', 'many2many')
+
+    @api.model
+    def _evaluate_stage_rules(self, records, requirement_type, groups, readiness=False):
+        """
+        Evaluate the compiled stage rules of a requirement type on records grouped by rule key
+        groups is a dict {(requirement_id, stage_id): [record ids]}
+        With readiness, only the fields tracked by the stored readiness are evaluated,
+        the other fields of the rules are never reported as missing
+        Returns a dict {record_id: [(warning_message, ((field_name, field_label), ...), missing_field_names), ...]}
+        for the records having rules on their stage
+        """
+        results = {}
+        for (requirement_id, stage_id), record_ids in groups.items():
+            stage_rules = self._get_compiled_stage_rules(requirement_type, requirement_id, stage_id)
+            if not stage_rules:
+                continue
+
+            group = records.browse(record_ids).with_prefetch(records._prefetch_ids)
+            field_names = {name for __, mandatory_fields, __ in stage_rules for name, __ in mandatory_fields}
+            if readiness:
+                field_names = {name for name in field_names if self._is_readiness_field(records._fields.get(name))}
+            missing = self._get_records_missing_fields(group, field_names)
+
+            for record in group:
+                results[record.id] = [
+                    (warning_msg, mandatory_fields, missing[record.id])
+                    for __, mandatory_fields, warning_msg in stage_rules
+                ]
+        return results
+
+    @api.model
+    def _get_stage_rule_failures(self, records, requirement_type, groups):
+        """
+        Get the failing stage rules of records grouped by rule key, see _evaluate_stage_rules
+        Returns a list of tuples (record, warning_message, missing_field_labels)
+        """
+        results = self._evaluate_stage_rules(records, requirement_type, groups)
+        failures = []
+        for record in records:
+            for warning_msg, mandatory_fields, missing_names in results.get(record.id, []):
+                missing_labels = [label for name, label in mandatory_fields if name in missing_names]
+                if missing_labels:
+                    failures.append((record, warning_msg, missing_labels))
+        return failures
+
+    @api.model
+    def _format_warning_message(self, warning_msg, missing_labels):
+        """
+        Format a custom warning message with the missing field labels
+        """
+        # Join field names with formatting
+        field_list = '"' + '", "'.join(missing_labels) + '"'
+
+        # Format the message using the field list
+        if '%s' in warning_msg:
+            return warning_msg % field_list
+        return warning_msg + ': ' + field_list
+
+    @api.model
+    def _raise_stage_rule_failures(self, failures, header):
+        """
+        Raise a single ValidationError for the failures of _get_stage_rule_failures
+        A single failure keeps its custom message, several failures are listed
+        one per record below the given header
+        """
+        if not failures:
+            return
+
+        if len(failures) == 1:
+            __, warning_msg, missing_labels = failures[0]
+            raise models.ValidationError(self._format_warning_message(warning_msg, missing_labels))
+
+        messages = [
+            f"{record.display_name}: {self._format_warning_message(warning_msg, missing_labels)}"
+            for record, warning_msg, missing_labels in failures
+        ]
+        raise models.ValidationError(header + '\n' + '\n'.join(messages))
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+
+def get_invoice_period(today, company_start_date=False, invoiced_until_date=False, oldest_unbilled_date=False):
+    """
+    Compute the invoicing period of a site: from the day after its watermark,
+    or from the company start date when not invoiced yet, to the last Sunday
+
+    The watermark only narrows the scan, it never skips billable time:
+    timesheets dated on or before it but logged after the run that set it
+    (e.g. last week's time entered on Monday after the Monday run) are still
+    unbilled, the oldest of them moves the start of the period back.
+
+    Args:
+        today: Date of the invoicing run
+        company_start_date: Company invoicing start date, no time before it is billed
+        invoiced_until_date: Watermark of the site, see ProjectProject.invoiced_until_date
+        oldest_unbilled_date: Date of the oldest billable timesheet not invoiced yet
+
+    Returns: Dict with start_date and end_date
+    """
+    # Get the most recent Sunday (0 = Monday, 6 = Sunday in Python's weekday)
+    idx = (today.weekday() + 1) % 7
+    this_sunday = today - timedelta(days=idx)
+
+    start_date = company_start_date
+    if invoiced_until_date:
+        watermark_start = invoiced_until_date + timedelta(days=1)
+        if oldest_unbilled_date and oldest_unbilled_date < watermark_start:
+            watermark_start = oldest_unbilled_date
+        if not start_date or watermark_start > start_date:
+            start_date = watermark_start
+
+    return {
+        'start_date': start_date,
+        'end_date': this_sunday
+    }
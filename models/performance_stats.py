@@ -0,0 +1,144 @@
+import functools
+import logging
+import threading
+import time
+from collections import deque
+
+from odoo import models, api, _
+from odoo.exceptions import AccessError
+
+_logger = logging.getLogger(__name__)
+
+# System parameter holding the duration (ms) from which a call is logged
+SLOW_CALL_THRESHOLD_PARAM = 'portcities_construction_site_mgmt.slow_call_threshold_ms'
+SLOW_CALL_THRESHOLD_DEFAULT = 500
+# Number of recent calls kept per instrumented method for the rolling aggregates
+ROLLING_WINDOW = 200
+
+_stats_lock = threading.Lock()
+# Rolling aggregates of this worker, {database name: {method name: stats}}
+_stats = {}
+# Invalid threshold values already reported, to log them once per worker
+_invalid_thresholds = set()
+
+
+def _record_call(dbname, name, duration_ms, query_count, record_count, failed=False):
+    """Add a call to the rolling aggregates of this worker for a database"""
+    with _stats_lock:
+        db_stats = _stats.setdefault(dbname, {})
+        stats = db_stats.setdefault(name, {'calls': 0, 'window': deque(maxlen=ROLLING_WINDOW)})
+        stats['calls'] += 1
+        stats['window'].append((duration_ms, query_count, record_count, failed))
+
+
+def _get_slow_call_threshold(env):
+    """
+    Get the slow call threshold (ms) from the system parameter; an invalid
+    value falls back to the default instead of breaking the instrumented call
+    """
+    value = env['ir.config_parameter'].sudo().get_param(SLOW_CALL_THRESHOLD_PARAM, SLOW_CALL_THRESHOLD_DEFAULT)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        if value not in _invalid_thresholds:
+            _invalid_thresholds.add(value)
+            _logger.warning(
+                "Invalid value %r for system parameter %s, using %s ms",
+                value, SLOW_CALL_THRESHOLD_PARAM, SLOW_CALL_THRESHOLD_DEFAULT
+            )
+        return SLOW_CALL_THRESHOLD_DEFAULT
+
+
+def instrumented(name, count=None):
+    """
+    Decorator measuring the SQL query count, wall time and records processed
+    by a model method; calls slower than the configured threshold are logged
+    and every call is kept in the rolling aggregates of the worker, including
+    the calls raising an error (e.g. a stage move rejected by a constraint)
+
+    :param name: name the calls are aggregated under
+    :param count: optional function (records, result) -> number of records
+        processed, defaults to the size of the recordset the method runs on
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            threshold = _get_slow_call_threshold(self.env)
+            cr = self.env.cr
+            query_start = cr.sql_log_count
+            time_start = time.perf_counter()
+            result = None
+            failed = True
+            try:
+                result = method(self, *args, **kwargs)
+                failed = False
+                return result
+            finally:
+                duration_ms = (time.perf_counter() - time_start) * 1000
+                query_count = cr.sql_log_count - query_start
+                # The result of a failed call is unknown, count the input records
+                record_count = count(self, result) if count and not failed else len(self)
+
+                _record_call(cr.dbname, name, duration_ms, query_count, record_count, failed)
+                if duration_ms >= threshold:
+                    _logger.info(
+                        "Slow call %s%s: %.0f ms, %s queries, %s records",
+                        name, " (failed)" if failed else "", duration_ms, query_count, record_count
+                    )
+        return wrapper
+    return decorator
+
+
+class SitePerformanceStats(models.AbstractModel):
+    """
+    Read access to the rolling aggregates of the instrumented methods
+
+    The aggregates live in the memory of each server process: with several
+    workers (prefork), get_stats() only returns the calls handled by the
+    worker serving the request, and they are lost when the worker restarts.
+    The slow call log lines cover all the workers.
+    """
+    _name = 'site.performance.stats'
+    _description = 'Site Performance Statistics'
+
+    def _check_stats_access(self):
+        if not self.env.is_admin():
+            raise AccessError(_("Only administrators can read the performance statistics."))
+
+    @api.model
+    def get_stats(self):
+        """
+        Get the rolling aggregates of the instrumented methods in this worker
+        Returns a list of dicts, one per instrumented method, slowest first
+        Only the calls of the worker serving this request on this database are included
+        """
+        self._check_stats_access()
+        with _stats_lock:
+            snapshot = {
+                name: (stats['calls'], list(stats['window']))
+                for name, stats in _stats.get(self.env.cr.dbname, {}).items()
+            }
+
+        result = []
+        for name, (calls, window) in snapshot.items():
+            durations = sorted(duration for duration, __, __, __ in window)
+            result.append({
+                'name': name,
+                'calls': calls,
+                'window_calls': len(window),
+                'failed_calls': sum(1 for __, __, __, failed in window if failed),
+                'avg_ms': sum(durations) / len(durations),
+                'p95_ms': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                'max_ms': durations[-1],
+                'avg_queries': sum(queries for __, queries, __, __ in window) / len(window),
+                'max_queries': max(queries for __, queries, __, __ in window),
+                'avg_records': sum(records for __, __, records, __ in window) / len(window),
+            })
+        return sorted(result, key=lambda stats: stats['avg_ms'], reverse=True)
+
+    @api.model
+    def reset_stats(self):
+        """Clear the rolling aggregates of this worker for this database"""
+        self._check_stats_access()
+        with _stats_lock:
+            _stats.pop(self.env.cr.dbname, None)
@@ -1,5 +1,10 @@
+from collections import defaultdict
+
 from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
+from odoo.osv import expression
+from odoo.tools import sql
+
+from .performance_stats import instrumented
 
 
 class ProjectProject(models.Model):
@@ -22,74 +27,312 @@ class ProjectProject(models.Model):
         domain=[('active', '=', True), ('type', '=', 'site')],
         help='Select a requirement to apply mandatory fields validation based on stages'
     )
+    milestone_requirement_id = fields.Many2one(
+        'dynamic.requirement.field',
+        string='Milestone Requirement',
+        domain=[('active', '=', True), ('type', '=', 'milestone')],
+        help='Select a requirement to apply mandatory fields validation on the milestones of this site'
+    )
+
+    # Stage readiness, stored so sites can be filtered and sorted on it
+    stage_missing_field_ids = fields.Many2many(
+        'ir.model.fields',
+        'project_project_stage_missing_field_rel',
+        'project_id',
+        'field_id',
+        string='Missing Fields',
+        compute='_compute_stage_readiness',
+        store=True,
+        help='Mandatory fields of the current stage that are still empty'
+    )
+    stage_ready = fields.Boolean(
+        string='Stage Ready',
+        compute='_compute_stage_readiness',
+        store=True
+    )
+    next_stage_id = fields.Many2one(
+        'project.project.stage',
+        string='Next Stage',
+        compute='_compute_stage_readiness',
+        store=True
+    )
+    next_stage_missing_field_ids = fields.Many2many(
+        'ir.model.fields',
+        'project_project_next_stage_missing_field_rel',
+        'project_id',
+        'field_id',
+        string='Missing Fields for Next Stage',
+        compute='_compute_stage_readiness',
+        store=True,
+        help='Mandatory fields of the next stage that are still empty'
+    )
+    next_stage_ready = fields.Boolean(
+        string='Ready for Next Stage',
+        compute='_compute_stage_readiness',
+        store=True
+    )
+    next_stage_readiness = fields.Float(
+        string='Next Stage Readiness (%)',
+        compute='_compute_stage_readiness',
+        store=True,
+        group_operator='avg',
+        help='Percentage of the mandatory fields of the next stage that are filled'
+    )
+    next_stage_readiness_state = fields.Selection([
+        ('none', 'No Requirement'),
+        ('ready', 'Ready'),
+        ('blocked', 'Blocked'),
+        ('unknown', 'Check on Move'),
+    ], string='Next Stage Readiness State',
+        compute='_compute_stage_readiness',
+        store=True
+    )
     
+    def init(self):
+        """
+        Create the partial index used by the timesheet fetches of the invoicing
+        (see study_case_refactored.py): only billable timesheets not invoiced
+        yet are indexed, by analytic account and date
+        The timesheet invoicing columns come from modules this one does not
+        depend on, the index is created once they exist, on install or update
+        """
+        super(ProjectProject, self).init()
+        if all(
+            sql.column_exists(self._cr, 'account_analytic_line', column)
+            for column in ('account_id', 'date', 'invoiceable_analytic_line', 'project_invoice_line_id')
+        ):
+            self._cr.execute('''
+                CREATE INDEX IF NOT EXISTS account_analytic_line_to_invoice_account_date_index
+                ON account_analytic_line (account_id, date)
+                WHERE invoiceable_analytic_line = 't' AND project_invoice_line_id IS NULL
+            ''')
+
     # Case 2, item 7: Add function to check mandatory fields when changing stage
     @api.constrains('stage_id')
+    @instrumented('project.project._check_mandatory_fields_on_stage_change')
     def _check_mandatory_fields_on_stage_change(self):
         """
         Check if all mandatory fields are filled when moving to a new stage
+        All the sites are validated at once and every failure is reported together
+        """
+        failures = self._get_stage_requirement_failures()
+        self.env['dynamic.requirement.field.line']._raise_stage_rule_failures(
+            failures, _("The following sites are missing mandatory fields:")
+        )
+
+    def _get_stage_requirement_failures(self, stage=None):
+        """
+        Get the mandatory fields missing on each site for its current stage,
+        or for the given stage when checking a move before writing it
+        Sites are grouped by (requirement, stage) so the rules are
+        resolved and the field values are read once per group
+        Returns a list of tuples (project, warning_message, missing_field_labels)
         """
+        groups = defaultdict(list)
         for project in self:
-            
-            validation = (not project.requirement_id or 
-                not project.requirement_id.active or 
-                project.requirement_id.type != 'site')
-            
-            # Skip validation if no requirement is set, if it's not active, or if type is not 'site'
-            if validation:
+            # Skip validation if no requirement is set, inactive requirements
+            # and requirements whose type is not 'site' compile to no rules
+            if not project.requirement_id:
                 continue
-                
-                
-            # Check if the current stage has mandatory fields defined
-            requirement_lines = self.env['dynamic.requirement.field.line'].search([
-                ('requirement_mandatory_project', '=', project.requirement_id.id),
-                ('stage_id', '=', project.stage_id.id),
-            ])
-            
-            if not requirement_lines:
+            target_stage = project.stage_id if stage is None else stage
+            key = (project.requirement_id.id, target_stage.id)
+            groups[key].append(project.id)
+
+        return self.env['dynamic.requirement.field.line']._get_stage_rule_failures(self, 'site', groups)
+
+    @api.model
+    def check_stage_transition(self, project_ids, stage_id):
+        """
+        Check the mandatory fields of the sites for a target stage without writing anything
+        Meant to be called by the client before moving sites, e.g. on kanban drag and drop
+        Returns a list of dicts {'id', 'name', 'missing_fields', 'message'} for the
+        sites that would be blocked, an empty list when the move is allowed
+        """
+        projects = self.browse(project_ids).exists()
+        projects.check_access_rights('read')
+        projects.check_access_rule('read')
+        stage = self.env['project.project.stage'].browse(stage_id)
+
+        line_obj = self.env['dynamic.requirement.field.line']
+        return [
+            {
+                'id': project.id,
+                'name': project.display_name,
+                'missing_fields': missing_labels,
+                'message': line_obj._format_warning_message(warning_msg, missing_labels),
+            }
+            for project, warning_msg, missing_labels in projects._get_stage_requirement_failures(stage)
+        ]
+
+    @api.depends('requirement_id', 'requirement_id.active', 'requirement_id.type', 'stage_id')
+    def _compute_stage_readiness(self):
+        """
+        Compute which mandatory fields are missing for the current and the next stage
+        Besides the dependencies above, it is only triggered when a field listed in
+        the mandatory fields of a requirement is written, see write(), so only the
+        fields written on the site itself are tracked, see _is_readiness_field
+        A next stage requiring other fields is never reported as ready: those
+        fields count as not satisfied and the state is 'unknown' (checked on move)
+        Missing fields are stored as ir.model.fields so they are translated at display
+        """
+        stages = self.env['project.project.stage'].search([])
+        next_stages = dict(zip(stages.ids, stages[1:]))
+
+        current_groups = defaultdict(list)
+        next_groups = defaultdict(list)
+        for project in self:
+            project.next_stage_id = next_stages.get(project.stage_id.id, False)
+            if not project.requirement_id:
                 continue
-                
-            # Check if all mandatory fields are filled
-            for line in requirement_lines:
-                missing_fields = []
-                
-                for field in line.mandatory_fields:
-                    field_value = getattr(project, field.name, None)
-                    if not field_value or (isinstance(field_value, str) and not field_value.strip()):
-                        field_label = field.field_description or field.name
-                        missing_fields.append(field_label)
-                
-                if missing_fields:
-                    # Get the custom warning message from the line
-                    warning_msg = line.custom_warning_message
-                    
-                    # Join field names with formatting
-                    field_list = '"' + '", "'.join(missing_fields) + '"'
-                    
-                    # Format the message using the field list
-                    if '%s' in warning_msg:
-                        formatted_msg = warning_msg % field_list
-                    else:
-                        formatted_msg = warning_msg + ': ' + field_list
-                    
-                    raise ValidationError(formatted_msg)
-                    
+            current_groups[(project.requirement_id.id, project.stage_id.id)].append(project.id)
+            if project.next_stage_id:
+                next_groups[(project.requirement_id.id, project.next_stage_id.id)].append(project.id)
+
+        line_obj = self.env['dynamic.requirement.field.line']
+        current_results = line_obj._evaluate_stage_rules(self, 'site', current_groups, readiness=True)
+        next_results = line_obj._evaluate_stage_rules(self, 'site', next_groups, readiness=True)
+        field_ids = self.env['ir.model.fields']._get_ids(self._name)
+
+        for project in self:
+            missing_names = [
+                name
+                for __, mandatory_fields, missing in current_results.get(project.id, [])
+                for name, __ in mandatory_fields if name in missing
+            ]
+            project.stage_missing_field_ids = [(6, 0, [field_ids[name] for name in dict.fromkeys(missing_names)])]
+            project.stage_ready = not missing_names
+
+            rule_results = next_results.get(project.id, [])
+            mandatory_count = sum(len(mandatory_fields) for __, mandatory_fields, __ in rule_results)
+            missing_names = [
+                name
+                for __, mandatory_fields, missing in rule_results
+                for name, __ in mandatory_fields if name in missing
+            ]
+            untracked_names = [
+                name
+                for __, mandatory_fields, __ in rule_results
+                for name, __ in mandatory_fields if not line_obj._is_readiness_field(self._fields.get(name))
+            ]
+            project.next_stage_missing_field_ids = [(6, 0, [field_ids[name] for name in dict.fromkeys(missing_names)])]
+            project.next_stage_ready = not missing_names and not untracked_names
+            if not project.requirement_id:
+                project.next_stage_readiness_state = 'none'
+            elif missing_names:
+                project.next_stage_readiness_state = 'blocked'
+            elif untracked_names:
+                project.next_stage_readiness_state = 'unknown'
+            else:
+                project.next_stage_readiness_state = 'ready'
+            if mandatory_count:
+                satisfied_count = mandatory_count - len(missing_names) - len(untracked_names)
+                project.next_stage_readiness = 100.0 * satisfied_count / mandatory_count
+            else:
+                project.next_stage_readiness = 100.0
+
+    @api.model
+    def get_stage_readiness_summary(self, domain=None):
+        """
+        Aggregate the sites blocked for their next stage, per stage, in a single query
+        Sites whose next stage requires fields checked only on move count as blocked
+        Returns a list of dicts {'stage_id', 'blocked_count', 'top_missing_field_id'}
+        where top_missing_field_id is the field missing on most of the blocked sites
+        """
+        domain = expression.AND([domain or [], [
+            ('requirement_id', '!=', False),
+            ('next_stage_ready', '=', False),
+        ]])
+        self.flush_model(['stage_id', 'requirement_id', 'next_stage_ready', 'next_stage_missing_field_ids'])
+        query = self._where_calc(domain)
+        self._apply_ir_rules(query, 'read')
+        subquery, params = query.subselect()
+        missing_field = self._fields['next_stage_missing_field_ids']
+
+        self.env.cr.execute(f"""
+            WITH blocked AS (
+                SELECT id, stage_id
+                FROM project_project
+                WHERE id IN ({subquery})
+            ), missing AS (
+                SELECT DISTINCT ON (blocked.stage_id) blocked.stage_id, rel."{missing_field.column2}" AS field_id
+                FROM blocked
+                JOIN "{missing_field.relation}" rel ON rel."{missing_field.column1}" = blocked.id
+                GROUP BY blocked.stage_id, rel."{missing_field.column2}"
+                ORDER BY blocked.stage_id, COUNT(*) DESC, rel."{missing_field.column2}"
+            )
+            SELECT blocked.stage_id, COUNT(*), MIN(missing.field_id)
+            FROM blocked
+            LEFT JOIN missing ON missing.stage_id IS NOT DISTINCT FROM blocked.stage_id
+            GROUP BY blocked.stage_id
+        """, params)
+        return [
+            {'stage_id': stage_id, 'blocked_count': blocked_count, 'top_missing_field_id': field_id or False}
+            for stage_id, blocked_count, field_id in self.env.cr.fetchall()
+        ]
+
+    @api.model
+    def read_group(self, domain, fields, groupby, offset=0, limit=None, orderby=False, lazy=True):
+        """
+        Show the blocked sites and their most missing field in the stage group
+        labels of the stage-grouped Sites list and kanban, which set the
+        site_readiness_group_label context key
+        """
+        groups = super(ProjectProject, self).read_group(
+            domain, fields, groupby, offset=offset, limit=limit, orderby=orderby, lazy=lazy
+        )
+        groupby = [groupby] if isinstance(groupby, str) else groupby
+        if not groups or not groupby or groupby[0] != 'stage_id' or not self.env.context.get('site_readiness_group_label'):
+            return groups
+
+        summary = {values['stage_id']: values for values in self.get_stage_readiness_summary(domain)}
+        missing_fields = self.env['ir.model.fields'].browse([
+            values['top_missing_field_id'] for values in summary.values() if values['top_missing_field_id']
+        ])
+        labels = {field.id: field.field_description for field in missing_fields}
+        for group in groups:
+            stage = group.get('stage_id')
+            values = summary.get(stage[0] if stage else None)
+            if stage and values and values['top_missing_field_id']:
+                group['stage_id'] = (stage[0], _(
+                    "%(stage)s (%(count)s blocked, mostly %(field)s)",
+                    stage=stage[1], count=values['blocked_count'], field=labels[values['top_missing_field_id']],
+                ))
+        return groups
+
+    def _recompute_stage_readiness(self):
+        """
+        Mark the stage readiness of these sites to be recomputed
+        """
+        for field_name in (
+            'stage_missing_field_ids', 'stage_ready', 'next_stage_id',
+            'next_stage_missing_field_ids', 'next_stage_ready', 'next_stage_readiness',
+            'next_stage_readiness_state',
+        ):
+            self.env.add_to_compute(self._fields[field_name], self)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        projects = super(ProjectProject, self).create(vals_list)
+        self.env['project.stage.transition']._log_transitions(projects, {})
+        return projects
+
+    @instrumented('project.project.write')
     def write(self, vals):
         """
-        Override write method to check mandatory fields before saving
+        Override write method to log stage transitions and to recompute the
+        stage readiness when a mandatory field changes
         """
         if 'stage_id' in vals:
-            # Store old stage to check if it changed
+            # Store old stages to log the sites whose stage changed
             old_stages = {rec.id: rec.stage_id.id for rec in self}
-            
-            # Call super to apply changes
-            result = super(ProjectProject, self).write(vals)
-            
-            # Check mandatory fields for records whose stage changed
-            for rec in self:
-                if old_stages.get(rec.id) != rec.stage_id.id:
-                    rec._check_mandatory_fields_on_stage_change()
-            
-            return result
-        else:
-            return super(ProjectProject, self).write(vals)
\ No newline at end of file
+
+        result = super(ProjectProject, self).write(vals)
+
+        if 'stage_id' in vals:
+            self.env['project.stage.transition']._log_transitions(self, old_stages)
+
+        mandatory_field_names = self.env['dynamic.requirement.field.line']._get_mandatory_field_names('site')
+        if mandatory_field_names.intersection(vals):
+            self._recompute_stage_readiness()
+
+        return result
@@ -0,0 +1,51 @@
+from odoo import models, fields, api
+
+
+class ProjectProjectStage(models.Model):
+    _inherit = 'project.project.stage'
+
+    blocked_site_count = fields.Integer(
+        string='Sites Blocked for Next Stage',
+        compute='_compute_readiness_summary'
+    )
+    top_missing_field_id = fields.Many2one(
+        'ir.model.fields',
+        string='Most Missing Field',
+        compute='_compute_readiness_summary'
+    )
+
+    def _compute_readiness_summary(self):
+        """
+        Compute the readiness counters of all the stages with one aggregation
+        """
+        summary = {
+            values['stage_id']: values
+            for values in self.env['project.project'].get_stage_readiness_summary([('stage_id', 'in', self.ids)])
+        }
+        for stage in self:
+            values = summary.get(stage.id, {})
+            stage.blocked_site_count = values.get('blocked_count', 0)
+            stage.top_missing_field_id = values.get('top_missing_field_id', False)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        stages = super(ProjectProjectStage, self).create(vals_list)
+        stages._recompute_site_readiness()
+        return stages
+
+    def write(self, vals):
+        result = super(ProjectProjectStage, self).write(vals)
+        # The next stage of a site depends on the order of all the stages
+        if 'sequence' in vals or 'active' in vals:
+            self._recompute_site_readiness()
+        return result
+
+    def _recompute_site_readiness(self):
+        """
+        Recompute the stage readiness of all the sites having a requirement,
+        including the sites hidden from the current user by record rules
+        """
+        projects = self.env['project.project'].sudo().with_context(active_test=False).search([
+            ('requirement_id', '!=', False),
+        ])
+        projects._recompute_stage_readiness()
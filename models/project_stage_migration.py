@@ -0,0 +1,194 @@
+import base64
+import csv
+import io
+import logging
+
+from odoo import models, fields, api, _
+
+_logger = logging.getLogger(__name__)
+
+
+class ProjectStageMigration(models.Model):
+    _name = 'project.stage.migration'
+    _description = 'Site Stage Migration'
+    _order = 'id desc'
+
+    name = fields.Char(string='Name', required=True, default=lambda self: _('Stage Migration %s') % fields.Date.today())
+    stage_id = fields.Many2one('project.project.stage', string='Target Stage', required=True)
+    chunk_size = fields.Integer(string='Sites per Chunk', default=200, required=True)
+    user_id = fields.Many2one(
+        'res.users',
+        string='Requested By',
+        required=True,
+        default=lambda self: self.env.user,
+        help='The sites are moved with the access rights of this user'
+    )
+    state = fields.Selection([
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ], string='Status', default='running', required=True)
+    line_ids = fields.One2many('project.stage.migration.line', 'migration_id', string='Sites')
+    pending_count = fields.Integer(string='Pending Sites', compute='_compute_counts')
+    moved_count = fields.Integer(string='Moved Sites', compute='_compute_counts')
+    failed_count = fields.Integer(string='Blocked Sites', compute='_compute_counts')
+    report_file = fields.Binary(string='Report', attachment=True, readonly=True)
+    report_filename = fields.Char(string='Report File Name')
+
+    _sql_constraints = [
+        ('chunk_size_positive', 'CHECK(chunk_size > 0)', 'The number of sites per chunk must be positive.'),
+    ]
+
+    @api.depends('line_ids.state')
+    def _compute_counts(self):
+        for migration in self:
+            states = migration.line_ids.mapped('state')
+            migration.pending_count = states.count('pending')
+            migration.moved_count = states.count('moved')
+            migration.failed_count = states.count('blocked')
+
+    @api.model
+    def _cron_process_stage_migrations(self, max_chunks=None):
+        """
+        Process the pending sites of all the running migrations
+
+        Several workers may run this at the same time: each chunk is claimed
+        with SKIP LOCKED, so workers share the pending sites without overlap.
+        """
+        for migration in self.search([('state', '=', 'running')], order='id asc'):
+            migration.with_user(migration.user_id)._process_chunks(max_chunks=max_chunks)
+
+    def _process_chunks(self, max_chunks=None, auto_commit=True):
+        """
+        Move the pending sites of this migration chunk by chunk
+
+        Progress is committed after every chunk, so a crashed or timed-out
+        run keeps the chunks already moved and resumes from the first site
+        still pending; the report is built once no site is pending.
+
+        Args:
+            max_chunks: Optional number of chunks to process in this call
+            auto_commit: Commit after each chunk, disabled in tests
+        """
+        self.ensure_one()
+        processed_chunks = 0
+        while max_chunks is None or processed_chunks < max_chunks:
+            lines = self._claim_chunk()
+            if not lines:
+                break
+
+            self._process_chunk(lines)
+            processed_chunks += 1
+
+            if auto_commit:
+                self.env.cr.commit()
+
+        if not self.line_ids.filtered(lambda line: line.state == 'pending'):
+            blocked_lines = self.line_ids.filtered(lambda line: line.state == 'blocked')
+            self.write({
+                'state': 'done',
+                'report_file': self._build_report(blocked_lines) if blocked_lines else False,
+                'report_filename': 'stage_migration_report.csv' if blocked_lines else False,
+            })
+            if auto_commit:
+                self.env.cr.commit()
+
+    def _claim_chunk(self):
+        """
+        Lock the next pending sites of the migration, skipping the ones locked by other workers
+
+        Returns: project.stage.migration.line records of the chunk
+        """
+        self.env['project.stage.migration.line'].flush_model(['migration_id', 'state'])
+        self.env.cr.execute('''
+            SELECT id
+            FROM project_stage_migration_line
+            WHERE migration_id = %s AND state = 'pending'
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        ''', (self.id, self.chunk_size))
+        return self.env['project.stage.migration.line'].browse([row[0] for row in self.env.cr.fetchall()])
+
+    def _process_chunk(self, lines):
+        """
+        Run the requirement checks of the stage change on a chunk first:
+        the sites passing them are moved, the others are left in their stage
+        and marked as blocked with their missing fields
+        """
+        line_obj = self.env['dynamic.requirement.field.line']
+        failures = lines.project_id._get_stage_requirement_failures(self.stage_id)
+        blocked = {}
+        for project, warning_msg, missing_labels in failures:
+            missing_fields, messages = blocked.setdefault(project.id, ([], []))
+            missing_fields += missing_labels
+            messages.append(line_obj._format_warning_message(warning_msg, missing_labels))
+
+        for line in lines.filtered(lambda line: line.project_id.id in blocked):
+            missing_fields, messages = blocked[line.project_id.id]
+            line.write({
+                'state': 'blocked',
+                'missing_fields': ', '.join(missing_fields),
+                'message': '\n'.join(messages),
+            })
+        self._move_lines(lines.filtered(lambda line: line.project_id.id not in blocked))
+
+    def _move_lines(self, lines):
+        """
+        Write the target stage on the sites that passed the requirement checks
+        The chunk is written at once in a savepoint; if it still fails (other
+        constraints, concurrent changes), sites are retried one by one so only
+        the failing ones are marked as blocked
+        """
+        if not lines:
+            return
+        try:
+            with self.env.cr.savepoint():
+                lines.project_id.write({'stage_id': self.stage_id.id})
+        except Exception:
+            pass
+        else:
+            lines.write({'state': 'moved'})
+            return
+
+        for line in lines:
+            try:
+                with self.env.cr.savepoint():
+                    line.project_id.write({'stage_id': self.stage_id.id})
+            except Exception as error:
+                _logger.warning("Stage migration of site %s failed: %s", line.project_id.display_name, error)
+                line.write({'state': 'blocked', 'message': str(error)})
+            else:
+                line.write({'state': 'moved'})
+
+    def _build_report(self, lines):
+        """
+        Build the CSV report of the sites that were not moved
+        """
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow([_('Site'), _('Current Stage'), _('Target Stage'), _('Missing Fields'), _('Message')])
+        for line in lines:
+            writer.writerow([
+                line.project_id.display_name,
+                line.project_id.stage_id.display_name or '',
+                self.stage_id.display_name,
+                line.missing_fields or '',
+                line.message or '',
+            ])
+        return base64.b64encode(output.getvalue().encode())
+
+
+class ProjectStageMigrationLine(models.Model):
+    _name = 'project.stage.migration.line'
+    _description = 'Site Stage Migration Line'
+    _order = 'id'
+
+    migration_id = fields.Many2one('project.stage.migration', string='Migration', required=True, ondelete='cascade', index=True)
+    project_id = fields.Many2one('project.project', string='Site', required=True, ondelete='cascade')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('moved', 'Moved'),
+        ('blocked', 'Blocked'),
+    ], string='Status', default='pending', required=True, index=True)
+    missing_fields = fields.Char(string='Missing Fields')
+    message = fields.Text(string='Message')
@@ -0,0 +1,55 @@
+from odoo import models, fields
+
+
+class ProjectStageTransition(models.Model):
+    _name = 'project.stage.transition'
+    _description = 'Site Stage Transition'
+    _order = 'date desc, id desc'
+    _log_access = False
+
+    project_id = fields.Many2one(
+        'project.project',
+        string='Site',
+        required=True,
+        ondelete='cascade',
+        readonly=True
+    )
+    from_stage_id = fields.Many2one('project.project.stage', string='From Stage', readonly=True)
+    to_stage_id = fields.Many2one('project.project.stage', string='To Stage', readonly=True)
+    date = fields.Datetime(string='Date', required=True, default=fields.Datetime.now, readonly=True, index=True)
+    user_id = fields.Many2one('res.users', string='User', readonly=True)
+    requirement_checked = fields.Boolean(
+        string='Requirement Checked',
+        readonly=True,
+        help='Whether the requirement of the site had mandatory fields to check for the new stage'
+    )
+
+    def init(self):
+        self._cr.execute('''
+            CREATE INDEX IF NOT EXISTS project_stage_transition_project_date_index
+            ON project_stage_transition (project_id, date)
+        ''')
+
+    def _log_transitions(self, projects, old_stages):
+        """
+        Append one transition per site whose stage changed
+        old_stages is a dict {project_id: stage_id} taken before the change
+        """
+        line_obj = self.env['dynamic.requirement.field.line']
+        now = fields.Datetime.now()
+        vals_list = [
+            {
+                'project_id': project.id,
+                'from_stage_id': old_stages.get(project.id, False),
+                'to_stage_id': project.stage_id.id,
+                'date': now,
+                'user_id': self.env.uid,
+                'requirement_checked': bool(project.requirement_id and line_obj._get_compiled_stage_rules(
+                    'site', project.requirement_id.id, project.stage_id.id
+                )),
+            }
+            for project in projects
+            if old_stages.get(project.id, False) != project.stage_id.id
+        ]
+        if vals_list:
+            self.sudo().create(vals_list)
@@ -0,0 +1,35 @@
+from collections import defaultdict
+
+from odoo import models, api, _
+
+
+class ProjectTask(models.Model):
+    _inherit = 'project.task'
+
+    @api.constrains('stage_id')
+    def _check_mandatory_fields_on_stage_change(self):
+        """
+        Check if all mandatory fields are filled when moving a milestone to a new stage
+        All the milestones are validated at once and every failure is reported together
+        """
+        failures = self._get_stage_requirement_failures()
+        self.env['dynamic.requirement.field.line']._raise_stage_rule_failures(
+            failures, _("The following milestones are missing mandatory fields:")
+        )
+
+    def _get_stage_requirement_failures(self):
+        """
+        Get the mandatory fields missing on each milestone for its current stage
+        The requirement comes from the milestone requirement of the site, and
+        milestones are grouped by (requirement, stage) like sites
+        Returns a list of tuples (task, warning_message, missing_field_labels)
+        """
+        groups = defaultdict(list)
+        for task in self:
+            requirement = task.project_id.milestone_requirement_id
+            if not requirement:
+                continue
+            key = (requirement.id, task.stage_id.id)
+            groups[key].append(task.id)
+
+        return self.env['dynamic.requirement.field.line']._get_stage_rule_failures(self, 'milestone', groups)
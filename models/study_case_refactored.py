@@ -2,15 +2,61 @@ from odoo import fields, models, api, _
 from datetime import timedelta, datetime, date
 from dateutil.relativedelta import relativedelta, MO, SU
 import logging
+import traceback
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import split_every
+
+from .invoice_period import get_invoice_period
+from .performance_stats import instrumented
 
 _logger = logging.getLogger(__name__)
 
+# Number of timesheet rows turned into invoice lines at once by the preview
+PREVIEW_CHUNK_SIZE = 200
+
+# Timesheet fields changing the weekly billable hours aggregate
+WEEKLY_HOURS_TRACKED_FIELDS = {
+    'account_id', 'project_id', 'task_id', 'user_id', 'date', 'unit_amount',
+    'invoiceable_analytic_line', 'project_invoice_line_id',
+}
+
+
+class InvoicePriceCache(object):
+    """
+    Run-scoped memo of invoice line prices
+    
+    Within one invoicing run the price key (pricelist, partner, job product,
+    date, uom) repeats for every worker with the same job, so each price is
+    computed once and reused; hits and misses are counted for profiling.
+    """
+    
+    def __init__(self):
+        self.prices = {}
+        self.hits = 0
+        self.misses = 0
+        
+    def get(self, key, compute):
+        """Return the cached price of key, calling compute() on a miss"""
+        if key in self.prices:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.prices[key] = compute()
+        return self.prices[key]
+
 
 class ProjectProject(models.Model):
     _inherit = "project.project"
 
-    def create_invoice_line(self, invoice):
+    invoiced_until_date = fields.Date(
+        string='Invoiced Up To',
+        copy=False,
+        help='Billable timesheets up to this date have been invoiced, '
+             'the next invoicing run scans the timesheets after it and the '
+             'ones dated before it but not invoiced yet'
+    )
+
+    def create_invoice_line(self, invoice, start_date=None, end_date=None):
         """
         Creates invoice lines based on billable timesheet entries from a project.
         
@@ -20,11 +66,117 @@ class ProjectProject(models.Model):
         
         Args:
             invoice: The invoice record to add lines to
+            start_date: Optional start of the period, defaults to the invoice period
+            end_date: Optional end of the period, defaults to the invoice period
             
         Returns:
             None - modifies invoice in place by adding lines
         """
         # Find related sale order through analytic account
+        sale_order = self._get_invoicing_sale_order()
+            
+        # Calculate date range for invoicing
+        invoice_period = self._get_invoice_period()
+        start_date = start_date or invoice_period['start_date']
+        end_date = end_date or invoice_period['end_date']
+        
+        # Get tasks and timesheets based on whether project uses sections
+        if sale_order.analytic_account_id.section_ids:
+            timesheet_ids = self._create_sectioned_invoice_lines(invoice, sale_order, start_date, end_date)
+        else:
+            timesheet_ids = self._create_standard_invoice_lines(invoice, sale_order, start_date, end_date)
+            
+        # Mark the timesheets actually billed as invoiced
+        self._mark_timesheets_as_invoiced(invoice, timesheet_ids)
+        
+        # Advance the invoicing watermark of the site
+        if not self.invoiced_until_date or end_date > self.invoiced_until_date:
+            self.invoiced_until_date = end_date
+        
+    def action_batch_invoice(self, start_date=None, end_date=None, chunk_size=50):
+        """
+        Invoice these sites for a period through a batch invoicing run
+        
+        The run keeps one line per site so it is processed in chunks with a
+        commit per chunk, see ProjectInvoicingRun._process_chunks.
+        
+        Returns: The created project.invoicing.run record
+        """
+        return self.env['project.invoicing.run'].create({
+            'start_date': start_date,
+            'end_date': end_date,
+            'chunk_size': chunk_size,
+            'state': 'running',
+            'line_ids': [(0, 0, {'project_id': project.id}) for project in self],
+        })
+        
+    def _create_batch_invoice(self, start_date=None, end_date=None):
+        """
+        Create the invoice of this site for a batch invoicing run
+        
+        Returns: The invoice, or an empty recordset when nothing was billed
+        """
+        self.ensure_one()
+        sale_order = self._get_invoicing_sale_order()
+            
+        invoice = self.env['account.invoice'].create(sale_order._prepare_invoice())
+        self.create_invoice_line(invoice, start_date, end_date)
+        
+        # Do not leave empty invoices behind for sites without billable time
+        if not invoice.invoice_line_ids:
+            invoice.unlink()
+            return self.env['account.invoice']
+        return invoice
+        
+    def action_reset_invoice_watermark(self, invoiced_until_date=False):
+        """
+        Reset the invoicing watermark of the sites, e.g. to re-invoice a period
+        
+        Args:
+            invoiced_until_date: New watermark, False to rescan from the company start date
+        """
+        self.write({'invoiced_until_date': invoiced_until_date})
+        
+    def _get_invoice_period(self):
+        """
+        Calculate the invoice period (from the day after the site watermark,
+        or from company setting when not invoiced yet, to current Sunday),
+        moved back to the oldest timesheet not invoiced yet, see get_invoice_period
+        """
+        company_start_date = self.env.user.company_id.inv_start_date
+        oldest_unbilled_date = False
+        if self.invoiced_until_date:
+            oldest_unbilled_date = self._get_oldest_unbilled_date(company_start_date)
+        return get_invoice_period(date.today(), company_start_date, self.invoiced_until_date, oldest_unbilled_date)
+
+    def _get_oldest_unbilled_date(self, company_start_date=False):
+        """
+        Get the date of the oldest billable timesheet of the site not invoiced yet
+        
+        Served by the partial index created in project_project.py, which only
+        holds the timesheets not invoiced yet, so it does not read the billed history.
+        """
+        self.env['account.analytic.line'].flush_model([
+            'account_id', 'date', 'invoiceable_analytic_line', 'project_id', 'project_invoice_line_id',
+        ])
+        query = '''
+            SELECT min(date)
+            FROM account_analytic_line
+            WHERE
+                account_id = %s
+                AND invoiceable_analytic_line = 't'
+                AND project_id is not null
+                AND project_invoice_line_id is null
+        '''
+        params = [self.analytic_account_id.id]
+        if company_start_date:
+            query += ' AND date >= %s'
+            params.append(company_start_date)
+        self._cr.execute(query, tuple(params))
+        return self._cr.fetchone()[0] or False
+    
+    def _get_invoicing_sale_order(self):
+        """Find the sale order related to the site through its analytic account"""
         sale_order = self.env['sale.order'].search(
             [('analytic_account_id', '=', self.analytic_account_id.id)], 
             limit=1
@@ -32,91 +184,125 @@ class ProjectProject(models.Model):
         
         if not sale_order:
             raise UserError(_("No sale order found for this project."))
-            
-        # Calculate date range for invoicing
+        return sale_order
+    
+    def preview_invoice_lines(self, start_date=None, end_date=None):
+        """
+        Yield the invoice lines the invoicing of this site would create
+        
+        Nothing is written: no invoice line is created and no timesheet is
+        marked, so project managers can check the draft before billing.
+        Lines are built chunk by chunk and yielded as they are ready.
+        
+        Yields: Dicts with section_id, employee_id, product_id, name, hours,
+        price_unit and subtotal
+        """
+        self.ensure_one()
+        sale_order = self._get_invoicing_sale_order()
+        
         invoice_period = self._get_invoice_period()
-        start_date = invoice_period['start_date']
-        end_date = invoice_period['end_date']
+        start_date = start_date or invoice_period['start_date']
+        end_date = end_date or invoice_period['end_date']
         
-        # Get tasks and timesheets based on whether project uses sections
         if sale_order.analytic_account_id.section_ids:
-            self._create_sectioned_invoice_lines(invoice, sale_order, start_date, end_date)
+            timesheet_rows = self._get_sectioned_timesheet_rows(sale_order, start_date, end_date)
         else:
-            self._create_standard_invoice_lines(invoice, sale_order, start_date, end_date)
+            timesheet_rows = self._get_standard_timesheet_rows(sale_order, start_date, end_date)
             
-        # Mark processed timesheets as invoiced
-        self._mark_timesheets_as_invoiced(invoice)
-        
-    def _get_invoice_period(self):
-        """Calculate the invoice period (from company setting to current Sunday)"""
-        today = date.today()
-        # Get the most recent Sunday (0 = Monday, 6 = Sunday in Python's weekday)
-        idx = (today.weekday() + 1) % 7
-        this_sunday = today - timedelta(days=idx)
-        
-        return {
-            'start_date': self.env.user.company_id.inv_start_date,
-            'end_date': this_sunday
-        }
+        no_invoice = self.env['account.invoice']
+        price_cache = InvoicePriceCache()
+        for rows in split_every(PREVIEW_CHUNK_SIZE, timesheet_rows, list):
+            values_list = self._prepare_employee_invoice_lines(no_invoice, sale_order, rows, price_cache)
+            for values in values_list:
+                yield {
+                    'section_id': values.get('layout_category_id', False),
+                    'employee_id': values['employee_id'],
+                    'product_id': values['product_id'],
+                    'name': values['name'],
+                    'hours': values['quantity'],
+                    'price_unit': values['price_unit'],
+                    'subtotal': values['quantity'] * values['price_unit'],
+                }
     
     def _create_sectioned_invoice_lines(self, invoice, sale_order, start_date, end_date):
-        """Create invoice lines grouped by sections"""
-        project_task_obj = self.env['project.task']
-        
-        for section in sale_order.analytic_account_id.section_ids:
-            # Get all tasks under this section's main task
-            parent_task = section.task_id
-            task_ids = project_task_obj.search([
-                ('parent_task_id', 'child_of', parent_task.id),
-                ('active', '=', True)
-            ], order='id asc')
-            
-            # Get timesheets for these tasks
-            timesheet_data = self._fetch_timesheet_data(
-                sale_order.analytic_account_id.id, 
-                start_date, 
-                end_date, 
-                task_ids
-            )
-            
-            # Create invoice lines for each user's time
-            for user_data in timesheet_data:
-                self._create_employee_invoice_line(
-                    invoice, 
-                    sale_order, 
-                    user_data[0],  # user_id
-                    user_data[1],  # unit_amount
-                    section_id=section.id
-                )
+        """
+        Create invoice lines grouped by sections
+        
+        Returns: List of the billed timesheet ids
+        """
+        timesheet_rows = self._get_sectioned_timesheet_rows(sale_order, start_date, end_date)
+                
+        # Create the invoice lines of all the sections at once
+        self._create_employee_invoice_lines(invoice, sale_order, timesheet_rows)
+        return list({timesheet_id for row in timesheet_rows for timesheet_id in row[2]})
     
     def _create_standard_invoice_lines(self, invoice, sale_order, start_date, end_date):
-        """Create invoice lines without sections"""
+        """
+        Create invoice lines without sections
+        
+        Returns: List of the billed timesheet ids
+        """
+        timesheet_rows = self._get_standard_timesheet_rows(sale_order, start_date, end_date)
+        
+        # Create invoice lines for each user's time
+        self._create_employee_invoice_lines(invoice, sale_order, timesheet_rows)
+        return [timesheet_id for row in timesheet_rows for timesheet_id in row[2]]
+    
+    def _get_sectioned_timesheet_rows(self, sale_order, start_date, end_date):
+        """
+        Get each user's billable time per section of the sale order
+        
+        Returns: List of tuples (user_id, hours, timesheet_ids, section_id)
+        """
+        sections = sale_order.analytic_account_id.section_ids
+        
+        # Get each user's time per section for the whole order at once
+        timesheet_data = self._fetch_sectioned_timesheet_data(
+            sections,
+            sale_order.analytic_account_id.id,
+            start_date,
+            end_date
+        )
+        
+        # Keep the order of the sections on the analytic account
+        section_sequence = {section_id: index for index, section_id in enumerate(sections.ids)}
+        return sorted(
+            [
+                (user_id, hours, timesheet_ids, section_id)
+                for section_id, user_id, hours, timesheet_ids in timesheet_data
+            ],
+            key=lambda row: (section_sequence[row[3]], row[0]),
+        )
+    
+    def _get_standard_timesheet_rows(self, sale_order, start_date, end_date):
+        """
+        Get each user's billable time for a sale order without sections
+        
+        Returns: List of tuples (user_id, hours, timesheet_ids, False)
+        """
         # Get timesheets for this project without specific tasks
         timesheet_data = self._fetch_timesheet_data(
             sale_order.analytic_account_id.id,
             start_date,
             end_date
         )
-        
-        # Create invoice lines for each user's time
-        for user_data in timesheet_data:
-            self._create_employee_invoice_line(
-                invoice, 
-                sale_order, 
-                user_data[0],  # user_id
-                user_data[1],  # unit_amount
-            )
+        return [
+            (user_id, hours, timesheet_ids, False)
+            for user_id, hours, timesheet_ids in timesheet_data
+        ]
     
+    @instrumented('project.project._fetch_timesheet_data', count=lambda records, result: len(result))
     def _fetch_timesheet_data(self, analytic_account_id, start_date, end_date, task_ids=None):
         """
-        Fetch billable timesheet data from the database
+        Fetch billable timesheet data from the database, aggregated per user
         
-        Returns: List of tuples (user_id, total_hours, timesheet_id)
+        Returns: List of tuples (user_id, total_hours, timesheet_ids)
         """
         query = '''
             SELECT
-                distinct(user_id),
-                sum(unit_amount), id
+                user_id,
+                sum(unit_amount),
+                array_agg(id ORDER BY id)
             FROM
                 account_analytic_line
             WHERE
@@ -135,39 +321,145 @@ class ProjectProject(models.Model):
             query += ' AND task_id in %s'
             params.append(tuple(task_ids.ids))
         
-        query += ' GROUP BY user_id, id ORDER BY user_id asc'
+        query += ' GROUP BY user_id ORDER BY user_id asc'
         
         self._cr.execute(query, tuple(params))
         return self._cr.fetchall()
     
-    def _create_employee_invoice_line(self, invoice, sale_order, user_id, hours, section_id=False):
+    @instrumented('project.project._fetch_sectioned_timesheet_data', count=lambda records, result: len(result))
+    def _fetch_sectioned_timesheet_data(self, sections, analytic_account_id, start_date, end_date):
         """
-        Create an invoice line for an employee's time
+        Fetch billable timesheet data of all the sections in a single query
+        
+        A recursive CTE walks the active tasks below each section's main task
+        (the tasks its parent_task_id hierarchy leads to), maps every
+        timesheet to its section and aggregates the hours per section and user.
+        
+        Returns: List of tuples (section_id, user_id, total_hours, timesheet_ids)
+        """
+        if not sections:
+            return []
+            
+        query = '''
+            WITH RECURSIVE section_task AS (
+                SELECT
+                    section.id AS section_id,
+                    task.id AS task_id
+                FROM
+                    {section_table} section
+                    JOIN project_task task ON task.parent_task_id = section.task_id
+                WHERE
+                    section.id in %s
+                    AND task.active = 't'
+                UNION
+                SELECT
+                    section_task.section_id,
+                    task.id
+                FROM
+                    section_task
+                    JOIN project_task task ON task.parent_task_id = section_task.task_id
+                WHERE
+                    task.active = 't'
+            )
+            SELECT
+                section_task.section_id,
+                line.user_id,
+                sum(line.unit_amount),
+                array_agg(line.id ORDER BY line.id)
+            FROM
+                account_analytic_line line
+                JOIN section_task ON section_task.task_id = line.task_id
+            WHERE
+                line.account_id = %s
+                AND line.invoiceable_analytic_line = 't'
+                AND line.date >= %s
+                AND line.date <= %s
+                AND line.project_id is not null
+                AND line.project_invoice_line_id is null
+            GROUP BY section_task.section_id, line.user_id
+            ORDER BY section_task.section_id, line.user_id asc
+        '''.format(section_table=sections._table)
+        
+        params = (tuple(sections.ids), analytic_account_id, start_date, end_date)
+        self._cr.execute(query, params)
+        return self._cr.fetchall()
+    
+    @instrumented('project.project._create_employee_invoice_lines', count=lambda records, result: len(result))
+    def _create_employee_invoice_lines(self, invoice, sale_order, timesheet_rows, price_cache=None):
+        """
+        Create the invoice lines for the employees' time of a whole invoicing run
+        
+        Employees, jobs, products and income accounts are resolved in bulk for
+        all the rows, the line values are built in memory and the invoice lines
+        are created with a single multi-record create.
         
         Args:
             invoice: Invoice record
             sale_order: Related sale order
-            user_id: User ID of the employee
-            hours: Number of hours worked
-            section_id: Optional section ID
+            timesheet_rows: List of tuples (user_id, hours, timesheet_ids, section_id)
+            price_cache: Optional InvoicePriceCache shared by the whole run
         """
-        # Find employee record
-        employee = self.env['hr.employee'].search([('user_id', '=', user_id)])
+        values_list = self._prepare_employee_invoice_lines(invoice, sale_order, timesheet_rows, price_cache)
+        return self.env['account.invoice.line'].create(values_list)
+    
+    def _prepare_employee_invoice_lines(self, invoice, sale_order, timesheet_rows, price_cache=None):
+        """
+        Build the invoice line values for the employees' time of a whole invoicing run
         
-        if employee:
-            # Create invoice line using employee record
-            self._create_invoice_line_from_employee(
-                invoice, sale_order, employee, hours, section_id
-            )
-        else:
-            # No employee record found, try to get data from custom method
-            employee_data = self.action_search_employee(user_id)
-            self._create_invoice_line_from_employee_data(
-                invoice, sale_order, employee_data, hours, section_id
-            )
+        Returns: List of invoice line values, one per timesheet row
+        """
+        if price_cache is None:
+            price_cache = InvoicePriceCache()
+            
+        user_ids = list({row[0] for row in timesheet_rows})
+        
+        # Find the employee records of all the users at once
+        employee_by_user = {}
+        for employee in self.env['hr.employee'].search([('user_id', 'in', user_ids)]):
+            employee_by_user.setdefault(employee.user_id.id, employee)
+            
+        # No employee record found, try to get data from custom method
+        employee_data_by_user = {
+            user_id: self.action_search_employee(user_id)
+            for user_id in user_ids if user_id not in employee_by_user
+        }
+        
+        # Prefetch jobs, products and income accounts for the whole run
+        employees = self.env['hr.employee'].browse([employee.id for employee in employee_by_user.values()])
+        jobs = employees.mapped('job_id')
+        products = jobs.mapped('product_inhouse_id') | jobs.mapped('product_outsource_id')
+        products.mapped('property_account_income_id')
+        jobs.mapped('product_id.uom_id')
+        
+        # Job products of the users without employee record, read at once
+        data_products = self.env['product.product'].browse([
+            employee_data['product_id'] for employee_data in employee_data_by_user.values()
+        ]).exists()
+        data_products.mapped('taxes_id')
+        data_product_by_id = {product.id: product for product in data_products}
+        
+        values_list = []
+        for user_id, hours, timesheet_ids, section_id in timesheet_rows:
+            if user_id in employee_by_user:
+                values = self._prepare_invoice_line_from_employee(
+                    invoice, sale_order, employee_by_user[user_id], hours, section_id, price_cache
+                )
+            else:
+                employee_data = employee_data_by_user[user_id]
+                job_product = data_product_by_id.get(employee_data['product_id'], data_products.browse())
+                values = self._prepare_invoice_line_from_employee_data(
+                    invoice, sale_order, employee_data, job_product, hours, section_id, price_cache
+                )
+            values_list.append(values)
+            
+        _logger.debug(
+            "Invoice line prices for %s: %s cache hits, %s cache misses",
+            sale_order.name, price_cache.hits, price_cache.misses
+        )
+        return values_list
     
-    def _create_invoice_line_from_employee(self, invoice, sale_order, employee, hours, section_id=False):
-        """Create invoice line using employee record"""
+    def _prepare_invoice_line_from_employee(self, invoice, sale_order, employee, hours, section_id=False, price_cache=None):
+        """Prepare invoice line values using employee record"""
         # Validate required products exist
         if not employee.job_id.product_inhouse_id:
             raise UserError(_('Please fill field Inhouse Product {} in Job Position').format(employee.job_id.name))
@@ -182,9 +474,9 @@ class ProjectProject(models.Model):
             product = employee.job_id.product_outsource_id
             
         # Calculate price
-        price = self._calculate_product_price(sale_order, product, employee.job_id.product_id)
+        price = self._calculate_product_price(sale_order, product, employee.job_id.product_id, price_cache)
         
-        # Create the invoice line
+        # Prepare the invoice line
         values = {
             'employee_id': employee.id,
             'product_id': product.id,
@@ -202,10 +494,10 @@ class ProjectProject(models.Model):
         if section_id:
             values['layout_category_id'] = section_id
             
-        self.env['account.invoice.line'].create(values)
+        return values
     
-    def _create_invoice_line_from_employee_data(self, invoice, sale_order, employee_data, hours, section_id=False):
-        """Create invoice line using employee data from action_search_employee"""
+    def _prepare_invoice_line_from_employee_data(self, invoice, sale_order, employee_data, job_product, hours, section_id=False, price_cache=None):
+        """Prepare invoice line values using employee data from action_search_employee"""
         # Validate employee data has required products
         if not employee_data.get('inhouse'):
             raise UserError(_('Please fill field Inhouse Product {} in Job Position').format(employee_data['position']))
@@ -221,14 +513,19 @@ class ProjectProject(models.Model):
             
         # Get product price
         if sale_order.pricelist_id and sale_order.partner_id:
-            product_record = self.env['product.product'].search([('id', '=', employee_data['product_id'])])
-            price = self.env['account.tax']._fix_tax_included_price(
-                product_record.price, product_record.taxes_id, []
+            if price_cache is None:
+                price_cache = InvoicePriceCache()
+            # Priced without pricelist context, keyed apart from the pricelist prices
+            price = price_cache.get(
+                ('product', job_product.id),
+                lambda: self.env['account.tax']._fix_tax_included_price(
+                    job_product.price, job_product.taxes_id, []
+                )
             )
         else:
             price = employee_data['list_price']
             
-        # Create invoice line
+        # Prepare invoice line
         values = {
             'employee_id': employee_data['employee_id'],
             'product_id': product.id,
@@ -246,31 +543,384 @@ class ProjectProject(models.Model):
         if section_id:
             values['layout_category_id'] = section_id
             
-        self.env['account.invoice.line'].create(values)
+        return values
     
-    def _calculate_product_price(self, sale_order, product, job_product):
-        """Calculate product price based on sale order and pricelist"""
+    def _calculate_product_price(self, sale_order, product, job_product, price_cache=None):
+        """
+        Calculate product price based on sale order and pricelist
+        
+        Pricelist prices are memoized in price_cache for the invoicing run
+        """
         so_line_obj = self.env['sale.order.line']
         
         if sale_order.pricelist_id and sale_order.partner_id:
-            product_with_context = job_product.with_context(
-                lang=sale_order.partner_id.lang,
-                partner=sale_order.partner_id.id,
-                quantity=1,
-                date=sale_order.date_order,
-                pricelist=sale_order.pricelist_id.id,
-                uom=job_product.uom_id.id
-            )
-            return self.env['account.tax']._fix_tax_included_price(
-                product_with_context.price, product_with_context.taxes_id, so_line_obj.tax_id
+            if price_cache is None:
+                price_cache = InvoicePriceCache()
+                
+            def compute_price():
+                product_with_context = job_product.with_context(
+                    lang=sale_order.partner_id.lang,
+                    partner=sale_order.partner_id.id,
+                    quantity=1,
+                    date=sale_order.date_order,
+                    pricelist=sale_order.pricelist_id.id,
+                    uom=job_product.uom_id.id
+                )
+                return self.env['account.tax']._fix_tax_included_price(
+                    product_with_context.price, product_with_context.taxes_id, so_line_obj.tax_id
+                )
+                
+            key = (
+                'pricelist',
+                sale_order.pricelist_id.id,
+                sale_order.partner_id.id,
+                job_product.id,
+                sale_order.date_order,
+                job_product.uom_id.id,
             )
+            return price_cache.get(key, compute_price)
         else:
             return job_product.list_price
     
-    def _mark_timesheets_as_invoiced(self, invoice):
-        """Mark all processed timesheets as invoiced"""
-        timesheets = self.check_timesheet_on_project()
-        for timesheet in timesheets:
-            self.env['account.analytic.line'].search([('id', '=', timesheet[2])]).write({
-                'project_invoice_line_id': invoice.id,
+    @instrumented('project.project._mark_timesheets_as_invoiced', count=lambda records, result: len(result))
+    def _mark_timesheets_as_invoiced(self, invoice, timesheet_ids):
+        """
+        Mark the billed timesheets as invoiced with a single write
+        
+        Only the ids returned by the fetch step are marked, so timesheets
+        logged after the fetch are left for the next invoicing run.
+        """
+        timesheets = self.env['account.analytic.line'].browse(timesheet_ids)
+        timesheets.write({
+            'project_invoice_line_id': invoice.id,
+        })
+        return timesheets
+
+
+class ProjectInvoicingRun(models.Model):
+    _name = 'project.invoicing.run'
+    _description = 'Site Invoicing Run'
+    _order = 'id desc'
+
+    name = fields.Char(string='Name', required=True, default=lambda self: _('Invoicing %s') % fields.Date.today())
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ], string='Status', default='draft', required=True)
+    start_date = fields.Date(string='Start Date')
+    end_date = fields.Date(string='End Date')
+    chunk_size = fields.Integer(string='Sites per Chunk', default=50, required=True)
+    line_ids = fields.One2many('project.invoicing.run.line', 'run_id', string='Sites')
+
+    def action_start(self):
+        """Start the run, its chunks are then processed by the cron"""
+        self.write({'state': 'running'})
+
+    @api.model
+    def _cron_process_invoicing_runs(self, max_chunks=None):
+        """
+        Process the pending sites of all the running invoicing runs
+        
+        Several workers may run this at the same time: each chunk is claimed
+        with SKIP LOCKED, so workers share the pending sites without overlap.
+        """
+        for run in self.search([('state', '=', 'running')], order='id asc'):
+            run._process_chunks(max_chunks=max_chunks)
+
+    def _process_chunks(self, max_chunks=None, auto_commit=True):
+        """
+        Invoice the pending sites of this run chunk by chunk
+        
+        Each site is invoiced in its own savepoint so a failing site is marked
+        as failed without losing the rest of its chunk, and progress is
+        committed after every chunk: a crashed or timed-out run resumes from
+        the first site still pending.
+        
+        Args:
+            max_chunks: Optional number of chunks to process in this call
+            auto_commit: Commit after each chunk, disabled in tests
+        """
+        self.ensure_one()
+        processed_chunks = 0
+        while max_chunks is None or processed_chunks < max_chunks:
+            lines = self._claim_chunk()
+            if not lines:
+                break
+                
+            for line in lines:
+                line._process()
+            processed_chunks += 1
+            
+            if auto_commit:
+                self.env.cr.commit()
+                
+        if not self.line_ids.filtered(lambda line: line.state == 'pending'):
+            self.state = 'done'
+            if auto_commit:
+                self.env.cr.commit()
+
+    def _claim_chunk(self):
+        """
+        Lock the next pending sites of the run, skipping the ones locked by other workers
+        
+        Returns: project.invoicing.run.line records of the chunk
+        """
+        self.env['project.invoicing.run.line'].flush_model(['run_id', 'state'])
+        self.env.cr.execute('''
+            SELECT id
+            FROM project_invoicing_run_line
+            WHERE run_id = %s AND state = 'pending'
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        ''', (self.id, self.chunk_size))
+        return self.env['project.invoicing.run.line'].browse([row[0] for row in self.env.cr.fetchall()])
+
+
+class ProjectInvoicingRunLine(models.Model):
+    _name = 'project.invoicing.run.line'
+    _description = 'Site Invoicing Run Line'
+    _order = 'id'
+
+    run_id = fields.Many2one('project.invoicing.run', string='Run', required=True, ondelete='cascade', index=True)
+    project_id = fields.Many2one('project.project', string='Site', required=True, ondelete='cascade')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='pending', required=True, index=True)
+    invoice_id = fields.Many2one('account.invoice', string='Invoice')
+    error_message = fields.Text(string='Error')
+
+    def _process(self):
+        """
+        Invoice the site of this line and record the outcome
+        
+        Any error is caught: letting it escape would roll back the chunk and
+        the next call would claim the same pending site again, forever.
+        """
+        self.ensure_one()
+        try:
+            with self.env.cr.savepoint():
+                invoice = self.project_id._create_batch_invoice(self.run_id.start_date, self.run_id.end_date)
+        except (UserError, ValidationError) as error:
+            _logger.warning("Invoicing of site %s failed: %s", self.project_id.display_name, error)
+            self.write({'state': 'failed', 'error_message': str(error)})
+        except Exception:
+            _logger.exception("Invoicing of site %s failed", self.project_id.display_name)
+            self.write({'state': 'failed', 'error_message': traceback.format_exc()})
+        else:
+            self.write({'state': 'done', 'invoice_id': invoice.id, 'error_message': False})
+
+
+class AccountAnalyticLine(models.Model):
+    _inherit = 'account.analytic.line'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super(AccountAnalyticLine, self).create(vals_list)
+        lines._mark_weekly_hours_dirty()
+        return lines
+
+    def write(self, vals):
+        tracked = bool(WEEKLY_HOURS_TRACKED_FIELDS.intersection(vals))
+        if tracked:
+            # The weeks the lines leave are outdated as well as the ones they join
+            self._mark_weekly_hours_dirty()
+        result = super(AccountAnalyticLine, self).write(vals)
+        if tracked:
+            self._mark_weekly_hours_dirty()
+        return result
+
+    def unlink(self):
+        self._mark_weekly_hours_dirty()
+        return super(AccountAnalyticLine, self).unlink()
+
+    def _mark_weekly_hours_dirty(self):
+        """Queue the weeks of these timesheets for the next weekly hours refresh"""
+        if not self:
+            return
+        self.flush_recordset(list(WEEKLY_HOURS_TRACKED_FIELDS))
+        self.env.cr.execute('''
+            INSERT INTO project_timesheet_weekly_dirty (account_id, week_start)
+            SELECT DISTINCT account_id, date_trunc('week', date)::date
+            FROM account_analytic_line
+            WHERE id in %s AND project_id is not null AND account_id is not null
+            ON CONFLICT DO NOTHING
+        ''', (tuple(self.ids),))
+
+
+class ProjectTimesheetWeekly(models.Model):
+    """
+    Billable timesheet hours aggregated by site, section, user and ISO week
+    
+    Rows are maintained in SQL: timesheet changes queue their (analytic
+    account, week) in project_timesheet_weekly_dirty and _refresh_dirty_weeks
+    rebuilds only those weeks, so reports read a few rows per site and week
+    instead of aggregating the raw analytic lines.
+    
+    Like the rest of this file, this model is not loaded by the module (it
+    relies on timesheet and invoicing fields the module does not depend on):
+    deploying it takes importing the file and adding an ir.cron calling
+    _cron_refresh_weekly_hours and access rules for the model.
+    """
+    _name = 'project.timesheet.weekly'
+    _description = 'Weekly Billable Hours'
+    _order = 'week_start desc, project_id, user_id'
+    _log_access = False
+
+    project_id = fields.Many2one('project.project', string='Site', readonly=True, index=True)
+    account_id = fields.Many2one('account.analytic.account', string='Analytic Account', readonly=True)
+    # Id of the analytic account section whose task tree holds the timesheets
+    section_id = fields.Integer(string='Section', readonly=True)
+    user_id = fields.Many2one('res.users', string='User', readonly=True)
+    week_start = fields.Date(string='Week', readonly=True, help='Monday of the ISO week')
+    hours = fields.Float(string='Billable Hours', readonly=True)
+    uninvoiced_hours = fields.Float(string='Hours to Invoice', readonly=True)
+    line_count = fields.Integer(string='Timesheets', readonly=True)
+
+    def init(self):
+        self._cr.execute('''
+            CREATE TABLE IF NOT EXISTS project_timesheet_weekly_dirty (
+                account_id integer NOT NULL,
+                week_start date NOT NULL,
+                PRIMARY KEY (account_id, week_start)
+            )
+        ''')
+        self._cr.execute('''
+            CREATE INDEX IF NOT EXISTS project_timesheet_weekly_account_week_index
+            ON project_timesheet_weekly (account_id, week_start)
+        ''')
+        # First install: queue every week holding timesheets
+        self._cr.execute('SELECT 1 FROM project_timesheet_weekly LIMIT 1')
+        if not self._cr.fetchone():
+            self._cr.execute('''
+                INSERT INTO project_timesheet_weekly_dirty (account_id, week_start)
+                SELECT DISTINCT account_id, date_trunc('week', date)::date
+                FROM account_analytic_line
+                WHERE project_id is not null AND account_id is not null
+                ON CONFLICT DO NOTHING
+            ''')
+
+    @api.model
+    def _cron_refresh_weekly_hours(self):
+        self._refresh_dirty_weeks()
+
+    @api.model
+    def _refresh_dirty_weeks(self):
+        """
+        Rebuild the aggregate rows of the weeks queued since the last refresh
+        
+        Returns: Number of (analytic account, week) pairs refreshed
+        """
+        self.env['account.analytic.line'].flush_model()
+        self._cr.execute('''
+            DELETE FROM project_timesheet_weekly_dirty
+            RETURNING account_id, week_start
+        ''')
+        weeks = self._cr.fetchall()
+        if not weeks:
+            return 0
+            
+        # Chunks of consecutive weeks keep the date range scanned per chunk narrow
+        weeks.sort(key=lambda week: (week[1], week[0]))
+        for week_keys in split_every(self._cr.IN_MAX, weeks):
+            week_keys = tuple(week_keys)
+            account_ids = tuple({account_id for account_id, __ in week_keys})
+            self._cr.execute('''
+                DELETE FROM project_timesheet_weekly
+                WHERE (account_id, week_start) in %s
+            ''', (week_keys,))
+            self._cr.execute(self._get_refresh_query(), {
+                'account_ids': account_ids,
+                'week_keys': week_keys,
+                'date_from': week_keys[0][1],
+                'date_to': week_keys[-1][1] + timedelta(days=7),
             })
+        self.invalidate_model()
+        return len(weeks)
+
+    @api.model
+    def _get_refresh_query(self):
+        """
+        Build the query aggregating the billable timesheets of the given weeks
+        
+        The account and date range predicates let the indexes on
+        account_analytic_line narrow the scan, the week keys then keep the
+        exact weeks of each account.
+        
+        Timesheets are mapped to their section with the same recursive walk of
+        the task tree as the sectioned invoicing, see _fetch_sectioned_timesheet_data;
+        sections are found through the section_ids one2many of the analytic account
+        """
+        section_field = self.env['account.analytic.account']._fields['section_ids']
+        sections = self.env[section_field.comodel_name]
+        return '''
+            WITH RECURSIVE section_task AS (
+                SELECT
+                    section.{account_column} AS account_id,
+                    section.id AS section_id,
+                    task.id AS task_id
+                FROM
+                    {section_table} section
+                    JOIN project_task task ON task.parent_task_id = section.task_id
+                WHERE
+                    section.{account_column} in %(account_ids)s
+                    AND task.active = 't'
+                UNION
+                SELECT
+                    section_task.account_id,
+                    section_task.section_id,
+                    task.id
+                FROM
+                    section_task
+                    JOIN project_task task ON task.parent_task_id = section_task.task_id
+                WHERE
+                    task.active = 't'
+            )
+            INSERT INTO project_timesheet_weekly
+                (project_id, account_id, section_id, user_id, week_start, hours, uninvoiced_hours, line_count)
+            SELECT
+                line.project_id,
+                line.account_id,
+                section_task.section_id,
+                line.user_id,
+                date_trunc('week', line.date)::date,
+                sum(line.unit_amount),
+                coalesce(sum(line.unit_amount) FILTER (WHERE line.project_invoice_line_id is null), 0),
+                count(*)
+            FROM
+                account_analytic_line line
+                LEFT JOIN section_task
+                    ON section_task.task_id = line.task_id
+                    AND section_task.account_id = line.account_id
+            WHERE
+                line.invoiceable_analytic_line = 't'
+                AND line.project_id is not null
+                AND line.account_id in %(account_ids)s
+                AND line.date >= %(date_from)s
+                AND line.date < %(date_to)s
+                AND (line.account_id, date_trunc('week', line.date)::date) in %(week_keys)s
+            GROUP BY 1, 2, 3, 4, 5
+        '''.format(section_table=sections._table, account_column=section_field.inverse_name)
+
+    @api.model
+    def get_weekly_billable_hours(self, project_ids, date_from=None, date_to=None):
+        """
+        Read the billable hours of sites per section, user and week
+        
+        The aggregate is read as of the last refresh of _cron_refresh_weekly_hours:
+        refreshing here would make concurrent readers consume the shared queue
+        of dirty weeks and fail on serialization errors.
+        
+        Returns: List of dicts read from the aggregate rows
+        """
+        domain = [('project_id', 'in', project_ids)]
+        if date_from:
+            domain.append(('week_start', '>=', date_from))
+        if date_to:
+            domain.append(('week_start', '<=', date_to))
+        return self.search_read(domain, [
+            'project_id', 'section_id', 'user_id', 'week_start', 'hours', 'uninvoiced_hours', 'line_count',
+        ])
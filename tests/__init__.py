@@ -0,0 +1,3 @@
+from . import test_invoice_period
+from . import test_missing_fields_parity
+from . import test_stage_requirement_performance
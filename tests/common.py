@@ -0,0 +1,126 @@
+import logging
+import os
+import time
+
+from odoo.tests.common import TransactionCase
+
+_logger = logging.getLogger(__name__)
+
+# Number of sites (and milestones) generated by the benchmarks, override with
+# e.g. SITE_MGMT_BENCHMARK_SCALE=2000 to profile at production size
+BENCHMARK_SCALE = int(os.environ.get('SITE_MGMT_BENCHMARK_SCALE', 200))
+# Size of the small batch the query count of a full batch is compared to
+SMALL_BATCH_SIZE = 10
+# Multi-record creates insert at most this many rows per query
+INSERT_BATCH_SIZE = 100
+
+
+class SiteBenchmarkCommon(TransactionCase):
+    """
+    Synthetic sites, stages, requirements and milestones shared by the
+    performance tests: a site requirement with rules on the second and third
+    site stages, and a milestone requirement with rules on one milestone stage
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super(SiteBenchmarkCommon, cls).setUpClass()
+        # Mail tracking writes one message per record, keep it out of the counts
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+
+        cls.partner = cls.env['res.partner'].create({'name': 'Benchmark Customer'})
+        cls.site_stages = cls.env['project.project.stage'].create([
+            {'name': f'Benchmark Stage {index}', 'sequence': 1000 + index}
+            for index in range(1, 4)
+        ])
+        cls.milestone_stages = cls.env['project.task.type'].create([
+            {'name': f'Benchmark Milestone Stage {index}', 'sequence': 1000 + index}
+            for index in range(1, 3)
+        ])
+
+        cls.site_requirement, cls.milestone_requirement = cls.env['dynamic.requirement.field'].create([
+            {
+                'name': 'Benchmark Site Requirement',
+                'type': 'site',
+                'mandatory_project_line': [
+                    (0, 0, {
+                        'stage_id': cls.site_stages[1].id,
+                        'mandatory_fields': [(6, 0, cls._get_field_ids('project.project', ['budget', 'deadline_date', 'partner_id']))],
+                        'custom_warning_message': 'Fields %s are mandatory',
+                    }),
+                    (0, 0, {
+                        'stage_id': cls.site_stages[2].id,
+                        'mandatory_fields': [(6, 0, cls._get_field_ids('project.project', ['project_size', 'date_start']))],
+                        'custom_warning_message': 'Fields %s are mandatory to close the site',
+                    }),
+                ],
+            },
+            {
+                'name': 'Benchmark Milestone Requirement',
+                'type': 'milestone',
+                'mandatory_project_line': [
+                    (0, 0, {
+                        'task_stage_id': cls.milestone_stages[1].id,
+                        'mandatory_fields': [(6, 0, cls._get_field_ids('project.task', ['date_deadline', 'partner_id']))],
+                        'custom_warning_message': 'Fields %s are mandatory',
+                    }),
+                ],
+            },
+        ])
+
+    @classmethod
+    def _get_field_ids(cls, model_name, field_names):
+        return [cls.env['ir.model.fields']._get(model_name, field_name).id for field_name in field_names]
+
+    @classmethod
+    def _create_sites(cls, count, ready=True, stage=None):
+        """
+        Create sites with the site requirement in the given stage, by default
+        the first one; ready sites have every mandatory field filled
+        """
+        stage = stage or cls.site_stages[0]
+        values = {
+            'budget': 1000.0,
+            'deadline_date': '2026-12-31 12:00:00',
+            'partner_id': cls.partner.id,
+        } if ready else {}
+        return cls.env['project.project'].create([
+            dict(values, name=f'Benchmark Site {index}', stage_id=stage.id, requirement_id=cls.site_requirement.id)
+            for index in range(count)
+        ])
+
+    @classmethod
+    def _create_milestones(cls, site, count, ready=True):
+        """
+        Create milestones in the milestone stage with rules, then set the
+        milestone requirement on their site so the blocked ones can exist
+        """
+        values = {
+            'date_deadline': '2026-12-31',
+            'partner_id': cls.partner.id,
+        } if ready else {}
+        milestones = cls.env['project.task'].create([
+            dict(values, name=f'Benchmark Milestone {index}', project_id=site.id, stage_id=cls.milestone_stages[1].id)
+            for index in range(count)
+        ])
+        site.milestone_requirement_id = cls.milestone_requirement
+        return milestones
+
+    def _count_queries(self, func):
+        """
+        Run func on a flushed, empty cache and return (query count, seconds),
+        pending computations and writes are flushed before counting stops
+        """
+        self.env.flush_all()
+        self.env.invalidate_all()
+        query_start = self.cr.sql_log_count
+        time_start = time.perf_counter()
+        func()
+        self.env.flush_all()
+        return self.cr.sql_log_count - query_start, time.perf_counter() - time_start
+
+    def _log_throughput(self, name, record_count, seconds):
+        _logger.info(
+            "Benchmark %s: %s records in %.3f s (%.0f records/s)",
+            name, record_count, seconds, record_count / seconds if seconds else 0.0
+        )
@@ -0,0 +1,41 @@
+from datetime import date
+
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase
+
+from ..models.invoice_period import get_invoice_period
+
+
+@tagged('post_install', '-at_install')
+class TestInvoicePeriod(BaseCase):
+    """
+    Invoicing period of a site around its watermark
+
+    The invoicing flow of study_case_refactored.py is not loaded by the
+    module, so the period logic it uses is tested on its own
+    """
+
+    def test_first_run_starts_at_company_start(self):
+        period = get_invoice_period(date(2026, 10, 12), date(2026, 1, 1))
+        self.assertEqual(period, {'start_date': date(2026, 1, 1), 'end_date': date(2026, 10, 11)})
+
+    def test_next_run_starts_after_watermark(self):
+        period = get_invoice_period(date(2026, 10, 19), date(2026, 1, 1), date(2026, 10, 11))
+        self.assertEqual(period, {'start_date': date(2026, 10, 12), 'end_date': date(2026, 10, 18)})
+
+    def test_back_dated_timesheet_logged_after_run_is_billed(self):
+        # The Monday run bills up to Sunday and sets the watermark
+        first_period = get_invoice_period(date(2026, 10, 12), date(2026, 1, 1))
+        invoiced_until_date = first_period['end_date']
+
+        # On Tuesday, time of the previous Friday is logged: still unbilled
+        back_dated = date(2026, 10, 9)
+        self.assertLessEqual(back_dated, invoiced_until_date)
+
+        next_period = get_invoice_period(date(2026, 10, 19), date(2026, 1, 1), invoiced_until_date, back_dated)
+        self.assertLessEqual(next_period['start_date'], back_dated)
+        self.assertEqual(next_period['end_date'], date(2026, 10, 18))
+
+    def test_unbilled_time_never_before_company_start(self):
+        period = get_invoice_period(date(2026, 10, 19), date(2026, 6, 1), date(2026, 10, 11), date(2026, 5, 4))
+        self.assertEqual(period['start_date'], date(2026, 6, 1))
@@ -0,0 +1,121 @@
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase, new_test_user
+
+# Site fields covering every kind of SQL emptiness predicate, plus a translated
+# field always read through the ORM
+PARITY_FIELD_NAMES = [
+    'name', 'description', 'label_tasks', 'budget', 'sequence', 'project_size', 'partner_id',
+    'date_start', 'deadline_date', 'active', 'tasks', 'tag_ids',
+]
+
+
+@tagged('post_install', '-at_install')
+class TestMissingFieldsParity(TransactionCase):
+    """
+    The SQL emptiness predicates of _get_records_missing_fields must give the
+    same result as the truthiness check on the field values done by the ORM
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestMissingFieldsParity, cls).setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.line_obj = cls.env['dynamic.requirement.field.line']
+        cls.partner = cls.env['res.partner'].create({'name': 'Parity Customer'})
+        cls.tag = cls.env['project.tags'].create({'name': 'Parity Tag'})
+
+        filled = {
+            'name': 'Filled Site',
+            'description': '<p>Description</p>',
+            'label_tasks': 'Milestones',
+            'budget': 1000.0,
+            'sequence': 5,
+            'project_size': 'small',
+            'partner_id': cls.partner.id,
+            'date_start': '2026-01-01',
+            'deadline_date': '2026-12-31 12:00:00',
+            'tag_ids': [(6, 0, cls.tag.ids)],
+            'privacy_visibility': 'employees',
+        }
+        cls.sites = cls.env['project.project'].create([
+            filled,
+            # Blank strings, zero numbers and empty relations
+            {
+                'name': '   ',
+                'description': False,
+                'label_tasks': ' ',
+                'budget': 0.0,
+                'sequence': 0,
+                'privacy_visibility': 'employees',
+            },
+            # False boolean
+            dict(filled, name='Archived Site', active=False),
+            # Only archived milestones
+            dict(filled, name='Site With Archived Milestones'),
+            # Only milestones hidden by a record rule
+            dict(filled, name='Site With Hidden Milestones'),
+        ])
+        cls.env['project.task'].create([
+            {'name': 'Visible Milestone', 'project_id': cls.sites[0].id},
+            {'name': 'Archived Milestone', 'project_id': cls.sites[3].id, 'active': False},
+            {'name': 'Hidden Milestone', 'project_id': cls.sites[4].id},
+        ])
+
+        cls.user = new_test_user(cls.env, login='parity_project_user', groups='project.group_project_user')
+        cls.env['ir.rule'].create({
+            'name': 'Hide parity milestones',
+            'model_id': cls.env['ir.model']._get_id('project.task'),
+            'domain_force': "[('name', '!=', 'Hidden Milestone')]",
+            'groups': [(6, 0, cls.env.ref('project.group_project_user').ids)],
+        })
+
+    def _get_orm_missing_fields(self, record, field_names):
+        """The original check, on the field values read through the ORM"""
+        missing = set()
+        for field_name in field_names:
+            field_value = getattr(record, field_name, None)
+            if not field_value or (isinstance(field_value, str) and not field_value.strip()):
+                missing.add(field_name)
+        return missing
+
+    def _assert_parity(self, records, field_names):
+        missing = self.line_obj._get_records_missing_fields(records, field_names)
+        for record in records:
+            self.assertEqual(
+                missing[record.id],
+                self._get_orm_missing_fields(record, field_names),
+                f"SQL and ORM disagree on the empty fields of {record.name!r}"
+            )
+
+    def test_parity_stored_records(self):
+        sites = self.sites.with_context(active_test=False)
+        self._assert_parity(sites, PARITY_FIELD_NAMES)
+
+        missing = self.line_obj._get_records_missing_fields(sites, PARITY_FIELD_NAMES)
+        self.assertFalse(missing[sites[0].id])
+        self.assertEqual(
+            missing[sites[1].id],
+            {'name', 'description', 'label_tasks', 'budget', 'sequence', 'project_size', 'partner_id',
+             'date_start', 'deadline_date', 'tasks', 'tag_ids'}
+        )
+        self.assertIn('active', missing[sites[2].id])
+        self.assertIn('tasks', missing[sites[3].id])
+        self.assertNotIn('tasks', missing[sites[4].id])
+
+    def test_parity_record_rules(self):
+        sites = self.sites.with_user(self.user).with_context(active_test=False)
+        self._assert_parity(sites, PARITY_FIELD_NAMES)
+
+        missing = self.line_obj.with_user(self.user)._get_records_missing_fields(sites, ['tasks'])
+        self.assertIn('tasks', missing[sites[4].id])
+
+    def test_parity_new_records(self):
+        scalar_field_names = [name for name in PARITY_FIELD_NAMES if name not in ('tasks', 'tag_ids')]
+        sites = self.sites.with_context(active_test=False)
+        stored_missing = self.line_obj._get_records_missing_fields(sites, scalar_field_names)
+
+        for site in sites:
+            new_site = site.new({name: site[name] for name in scalar_field_names})
+            new_missing = self.line_obj._get_records_missing_fields(new_site, scalar_field_names)
+            self.assertEqual(new_missing[new_site.id], stored_missing[site.id])
+            self.assertEqual(new_missing[new_site.id], self._get_orm_missing_fields(new_site, scalar_field_names))
@@ -0,0 +1,118 @@
+from odoo.exceptions import ValidationError
+from odoo.tests import tagged
+
+from .common import SiteBenchmarkCommon, BENCHMARK_SCALE, SMALL_BATCH_SIZE, INSERT_BATCH_SIZE
+
+
+@tagged('post_install', '-at_install', 'site_performance')
+class TestStageRequirementPerformance(SiteBenchmarkCommon):
+    """
+    Query budgets of the stage requirement checks: validating a batch of
+    BENCHMARK_SCALE records must cost the same number of queries as a batch of
+    SMALL_BATCH_SIZE records, up to the batching of inserts and IN clauses,
+    so any per-record query (N+1) makes these tests fail
+    """
+
+    def _get_query_budget(self, small_count, record_count):
+        return small_count + record_count // INSERT_BATCH_SIZE + 1
+
+    def _warm_up(self, func):
+        """Run func once so the rule and parameter caches are filled"""
+        self._count_queries(func)
+
+    def test_site_stage_change_query_count(self):
+        warm_up_site = self._create_sites(1)
+        small_sites = self._create_sites(SMALL_BATCH_SIZE)
+        sites = self._create_sites(BENCHMARK_SCALE)
+        target_stage = self.site_stages[1]
+
+        self._warm_up(lambda: warm_up_site.write({'stage_id': target_stage.id}))
+        small_count, __ = self._count_queries(lambda: small_sites.write({'stage_id': target_stage.id}))
+
+        self.env.flush_all()
+        self.env.invalidate_all()
+        with self.assertQueryCount(self._get_query_budget(small_count, len(sites))):
+            sites.write({'stage_id': target_stage.id})
+
+        self.assertEqual(sites.stage_id, target_stage)
+        self.assertEqual(
+            self.env['project.stage.transition'].search_count([
+                ('project_id', 'in', sites.ids),
+                ('to_stage_id', '=', target_stage.id),
+            ]),
+            len(sites)
+        )
+
+    def test_site_stage_change_throughput(self):
+        sites = self._create_sites(BENCHMARK_SCALE)
+        stats_obj = self.env['site.performance.stats']
+        stats_obj.reset_stats()
+        query_count, seconds = self._count_queries(lambda: sites.write({'stage_id': self.site_stages[1].id}))
+        self._log_throughput('site stage change', len(sites), seconds)
+
+        stats = {stats['name']: stats for stats in stats_obj.get_stats()}
+        self.assertIn('project.project.write', stats)
+        self.assertIn('project.project._check_mandatory_fields_on_stage_change', stats)
+        self.assertLessEqual(stats['project.project.write']['max_queries'], query_count)
+
+    def test_site_blocked_stage_change(self):
+        sites = self._create_sites(SMALL_BATCH_SIZE, ready=False)
+        with self.assertRaises(ValidationError):
+            sites.write({'stage_id': self.site_stages[1].id})
+
+    def test_site_check_stage_transition_query_count(self):
+        small_sites = self._create_sites(SMALL_BATCH_SIZE, ready=False)
+        sites = self._create_sites(BENCHMARK_SCALE, ready=False)
+        target_stage = self.site_stages[1]
+        project_obj = self.env['project.project']
+
+        self._warm_up(lambda: project_obj.check_stage_transition(small_sites[:1].ids, target_stage.id))
+        small_count, __ = self._count_queries(lambda: project_obj.check_stage_transition(small_sites.ids, target_stage.id))
+
+        self.env.flush_all()
+        self.env.invalidate_all()
+        with self.assertQueryCount(self._get_query_budget(small_count, len(sites))):
+            blocked = project_obj.check_stage_transition(sites.ids, target_stage.id)
+
+        self.assertEqual(len(blocked), len(sites))
+        self.assertEqual(
+            set(blocked[0]['missing_fields']),
+            {'Budget', 'Deadline Date', 'Customer'}
+        )
+
+    def test_site_stage_readiness_query_count(self):
+        small_sites = self._create_sites(SMALL_BATCH_SIZE, ready=False)
+        sites = self._create_sites(BENCHMARK_SCALE, ready=False)
+
+        self._warm_up(lambda: small_sites[:1]._recompute_stage_readiness())
+        small_count, __ = self._count_queries(small_sites._recompute_stage_readiness)
+
+        self.env.flush_all()
+        self.env.invalidate_all()
+        with self.assertQueryCount(self._get_query_budget(small_count, len(sites))):
+            sites._recompute_stage_readiness()
+
+        self.assertFalse(any(sites.mapped('next_stage_ready')))
+        self.assertEqual(set(sites.mapped('next_stage_readiness_state')), {'blocked'})
+
+    def test_milestone_stage_check_query_count(self):
+        small_site, site = self._create_sites(2)
+        small_milestones = self._create_milestones(small_site, SMALL_BATCH_SIZE, ready=False)
+        milestones = self._create_milestones(site, BENCHMARK_SCALE, ready=False)
+
+        self._warm_up(small_milestones[:1]._get_stage_requirement_failures)
+        small_count, __ = self._count_queries(small_milestones._get_stage_requirement_failures)
+
+        self.env.flush_all()
+        self.env.invalidate_all()
+        with self.assertQueryCount(self._get_query_budget(small_count, len(milestones))):
+            failures = milestones._get_stage_requirement_failures()
+
+        self.assertEqual(len(failures), len(milestones))
+
+    def test_milestone_stage_check_throughput(self):
+        site = self._create_sites(1)
+        milestones = self._create_milestones(site, BENCHMARK_SCALE)
+
+        __, seconds = self._count_queries(milestones._check_mandatory_fields_on_stage_change)
+        self._log_throughput('milestone stage check', len(milestones), seconds)
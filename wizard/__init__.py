@@ -0,0 +1,2 @@
+from . import dynamic_requirement_template_wizard
+from . import project_stage_migration_wizard
@@ -0,0 +1,75 @@
+import base64
+import json
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+
+class DynamicRequirementTemplateWizard(models.TransientModel):
+    _name = 'dynamic.requirement.template.wizard'
+    _description = 'Requirement Templates Import/Export'
+
+    requirement_ids = fields.Many2many(
+        'dynamic.requirement.field',
+        string='Requirements',
+        default=lambda self: self._default_requirement_ids()
+    )
+    template_file = fields.Binary(string='Template File')
+    template_filename = fields.Char(string='File Name')
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        default=lambda self: self.env.company,
+        help='Company of the imported requirements'
+    )
+
+    @api.model
+    def _default_requirement_ids(self):
+        if self.env.context.get('active_model') == 'dynamic.requirement.field':
+            return [(6, 0, self.env.context.get('active_ids', []))]
+        return []
+
+    def action_export(self):
+        """
+        Export the selected requirements to a JSON template file
+        """
+        self.ensure_one()
+        if not self.requirement_ids:
+            raise UserError(_("Select the requirements to export."))
+
+        templates = self.requirement_ids.export_requirement_templates()
+        self.write({
+            'template_file': base64.b64encode(json.dumps(templates, indent=2).encode()),
+            'template_filename': 'requirement_templates.json',
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def action_import(self):
+        """
+        Create the requirements of a JSON template file in the selected company
+        """
+        self.ensure_one()
+        if not self.template_file:
+            raise UserError(_("Upload a template file to import."))
+
+        try:
+            templates = json.loads(base64.b64decode(self.template_file))
+        except ValueError:
+            raise UserError(_("The template file is not a valid JSON file."))
+
+        requirements = self.env['dynamic.requirement.field'].import_requirement_templates(
+            templates, self.company_id.id
+        )
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Imported Requirements'),
+            'res_model': 'dynamic.requirement.field',
+            'view_mode': 'tree,form',
+            'domain': [('id', 'in', requirements.ids)],
+        }
@@ -0,0 +1,46 @@
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+
+class ProjectStageMigrationWizard(models.TransientModel):
+    _name = 'project.stage.migration.wizard'
+    _description = 'Site Stage Migration'
+
+    project_ids = fields.Many2many(
+        'project.project',
+        string='Sites',
+        default=lambda self: self._default_project_ids()
+    )
+    stage_id = fields.Many2one('project.project.stage', string='Target Stage', required=True)
+    chunk_size = fields.Integer(string='Sites per Chunk', default=200, required=True)
+
+    @api.model
+    def _default_project_ids(self):
+        if self.env.context.get('active_model') == 'project.project':
+            return [(6, 0, self.env.context.get('active_ids', []))]
+        return []
+
+    def action_apply(self):
+        """
+        Queue the move of the selected sites to the target stage
+        The sites are moved in the background chunk by chunk, with a commit per
+        chunk, see ProjectStageMigration._process_chunks; the migration record
+        shows the progress and the report of the blocked sites
+        """
+        self.ensure_one()
+        if self.chunk_size <= 0:
+            raise UserError(_("The number of sites per chunk must be positive."))
+
+        migration = self.env['project.stage.migration'].create({
+            'stage_id': self.stage_id.id,
+            'chunk_size': self.chunk_size,
+            'line_ids': [(0, 0, {'project_id': project_id}) for project_id in self.project_ids.ids],
+        })
+        self.env.ref('portcities_construction_site_mgmt.ir_cron_process_stage_migrations')._trigger()
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'project.stage.migration',
+            'res_id': migration.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }